@@ -1,29 +1,74 @@
 """
 Ultra-Simplified FastAPI server for AI-powered legal document analysis
-Only 2 endpoints: /health, /analyze-legal-document
+Endpoints: /health, /metrics, /analyze-legal-document (+ /stream variant), /jobs, /analyze-clauses
 No user tracking, no document storage - just pure AI analysis
 """
 
 import os
+import asyncio
+import contextvars
+import json
+import hashlib
 import tempfile
-import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List
+from typing import Callable, List, Optional, Tuple
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Request, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 import aiofiles
 
-# Import only essential modules
-from gemini_service import GeminiLegalAnalyzer
+# Import only essential modules - text_extractor (PyMuPDF, OpenCV, Tesseract) and
+# gemini_service (google-generativeai) are imported by load_pipeline() after startup
+from gemini_scheduler import FakeGeminiBackend, GeminiBackend, GeminiScheduler
 from config import settings
-from text_extractor import extract_text_fast
+from metrics import collect_timings, render_metrics, span
+from job_queue import InMemoryJobStore, JobScheduler, QueueFullError, SQLiteJobStore, new_job_record
+from result_cache import ResultCache, make_cache_key
+from prompt_compactor import compact_pages
+
+def check_worker_settings() -> None:
+    """Refuse to start several workers with the in-memory job store"""
+    if settings.WEB_CONCURRENCY > 1 and settings.JOB_STORE_BACKEND != "sqlite":
+        # Each worker would only see its own jobs, so GET/DELETE /jobs/{id} would 404 at random
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} needs JOB_STORE_BACKEND=sqlite - "
+            "the in-memory job store is not shared between workers"
+        )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup warms this worker up in the background, so /health answers while
+    the OCR pool and Gemini client are prepared. Shutdown lets queued and
+    running jobs finish (up to SHUTDOWN_DRAIN_TIMEOUT) before stopping the pools.
+    """
+    check_worker_settings()
+    settings.ensure_directories()
+    create_job_scheduler()
+    job_scheduler.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    await job_scheduler.drain(settings.SHUTDOWN_DRAIN_TIMEOUT)
+    job_store.close()
+    warm_up_task.cancel()
+    if gemini_analyzer:
+        gemini_analyzer.scheduler.close()
+    if pipeline_ready.is_set():
+        from text_extractor import shutdown_ocr_pool
+        shutdown_ocr_pool()
+    extraction_executor.shutdown(wait=False, cancel_futures=True)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Legal AI Analysis API",
     description="Ultra-simplified API for AI-powered legal document analysis with Gemini",
-    version="3.0.0"
+    version="3.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -31,21 +76,147 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
-# Initialize Gemini AI analyzer
+def format_size(size: int) -> str:
+    """Human-readable byte count for limit messages (decimal units, like MAX_FILE_SIZE)"""
+    for unit, scale in (("GB", 1_000_000_000), ("MB", 1_000_000), ("KB", 1_000)):
+        if size >= scale:
+            return f"{size / scale:.3g}{unit}"
+    return f"{size} bytes"
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Refuse upload bodies whose Content-Length is over MAX_REQUEST_SIZE before
+    Starlette spools them to disk; save_upload still enforces MAX_FILE_SIZE
+    per file while reading (chunked bodies have no Content-Length)
+    """
+    length = request.headers.get("content-length", "")
+    if request.method == "POST" and length.isdigit() and int(length) > settings.MAX_REQUEST_SIZE:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload exceeds the {format_size(settings.MAX_REQUEST_SIZE)} request limit"}
+        )
+    return await call_next(request)
+
+# Uploads are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Dedicated threads for PDF extraction, so it never runs on the event loop
+extraction_executor = ThreadPoolExecutor(
+    max_workers=settings.EXTRACTION_THREADS,
+    thread_name_prefix="extract"
+)
+
+# Bounds how many uploaded files are extracted/analyzed at once, across requests
+file_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_JOBS)
+
+# Built by load_pipeline() at startup
+result_cache = None  # finished analyses for byte-identical uploads
+clause_cache = None  # per-clause results, so shared boilerplate clauses skip Gemini
 gemini_analyzer = None
-if settings.GEMINI_API_KEY and settings.GEMINI_API_KEY != "your-gemini-api-key-here":
+use_fake_gemini = settings.GEMINI_BACKEND == "fake"
+
+# Set once the warm-up has finished (or failed); extraction and analysis wait for it
+pipeline_ready = asyncio.Event()
+
+def create_caches() -> None:
+    """Open the result and clause caches (SQLite files live in MODEL_CACHE_DIR)"""
+    global result_cache, clause_cache
+    if settings.RESULT_CACHE_ENABLED:
+        result_cache = ResultCache(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESULT_CACHE_TTL,
+            backend=settings.RESULT_CACHE_BACKEND,
+            db_path=os.path.join(settings.MODEL_CACHE_DIR, "result_cache.sqlite3")
+        )
+    if settings.CLAUSE_CACHE_ENABLED:
+        clause_cache = ResultCache(
+            max_entries=settings.CLAUSE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESULT_CACHE_TTL,
+            backend=settings.RESULT_CACHE_BACKEND,
+            db_path=os.path.join(settings.MODEL_CACHE_DIR, "clause_cache.sqlite3")
+        )
+
+def create_gemini_scheduler(backend) -> GeminiScheduler:
+    """Scheduler sized to the configured Gemini quota, shared by every request"""
+    return GeminiScheduler(
+        backend,
+        requests_per_minute=settings.GEMINI_RPM,
+        tokens_per_minute=settings.GEMINI_TPM,
+        max_retries=settings.GEMINI_MAX_RETRIES,
+        backoff_base=settings.GEMINI_BACKOFF_BASE,
+        backoff_max=settings.GEMINI_BACKOFF_MAX,
+        call_timeout=settings.GEMINI_CALL_TIMEOUT,
+        deadline=settings.GEMINI_DEADLINE
+    )
+
+def create_gemini_analyzer():
+    """Initialize the Gemini AI analyzer, or return None when it is not configured"""
+    if not (use_fake_gemini or (settings.GEMINI_API_KEY and settings.GEMINI_API_KEY != "your-gemini-api-key-here")):
+        print("⚠️ Gemini API key not configured")
+        return None
+    
+    from gemini_service import GeminiLegalAnalyzer
     try:
-        gemini_analyzer = GeminiLegalAnalyzer(settings.GEMINI_API_KEY)
+        analyzer = GeminiLegalAnalyzer(
+            settings.GEMINI_API_KEY,
+            chunk_max_tokens=settings.CHUNK_MAX_TOKENS,
+            max_parallel_chunks=settings.MAX_PARALLEL_CHUNKS,
+            clause_cache=clause_cache,
+            clause_batch_max_tokens=settings.CLAUSE_BATCH_MAX_TOKENS,
+            clause_batch_max_items=settings.CLAUSE_BATCH_MAX_ITEMS,
+            json_mode=settings.GEMINI_JSON_MODE,
+            triage=settings.TRIAGE_ENABLED
+        )
+        if use_fake_gemini:
+            backend = FakeGeminiBackend(latency=settings.GEMINI_FAKE_LATENCY, rate_limit_rate=settings.GEMINI_FAKE_429_RATE)
+            print("⚠️ Using the fake Gemini backend - analyses are simulated")
+            analyzer.model_name = f"fake:{analyzer.model_name}"  # keep simulated results out of real cache entries
+        else:
+            backend = GeminiBackend(analyzer.model)
+        analyzer.scheduler = create_gemini_scheduler(backend)
         print("✅ Gemini AI analyzer initialized successfully")
+        return analyzer
     except Exception as e:
         print(f"❌ Failed to initialize Gemini AI: {str(e)}")
-        gemini_analyzer = None
-else:
-    print("⚠️ Gemini API key not configured")
+        return None
+
+def load_pipeline() -> None:
+    """
+    Import the extraction and AI modules, open the caches, build the analyzer
+    and start the OCR workers. Blocking - runs on an extraction thread.
+    """
+    global gemini_analyzer
+    start = time.perf_counter()
+    import text_extractor
+    create_caches()
+    gemini_analyzer = create_gemini_analyzer()
+    text_extractor.get_page_cache()
+    workers = text_extractor.warm_ocr_pool()
+    print(f"🔥 Worker {os.getpid()} warmed up in {time.perf_counter() - start:.1f}s ({workers} OCR workers)")
+
+async def warm_up() -> None:
+    """Run load_pipeline() off the event loop, then open the Gemini client connections"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(extraction_executor, load_pipeline)
+        if gemini_analyzer:
+            gemini_analyzer.scheduler.backend.warm()
+    except Exception as e:
+        print(f"❌ Warm-up failed: {str(e)}")
+    finally:
+        pipeline_ready.set()
+
+def page_cache_stats() -> Optional[dict]:
+    """Page cache counters, without importing text_extractor before the warm-up has"""
+    if not pipeline_ready.is_set():
+        return None
+    from text_extractor import get_page_cache
+    page_cache = get_page_cache()
+    return page_cache.stats() if page_cache else None
 
 @app.get("/health")
 async def health_check():
@@ -56,22 +227,42 @@ async def health_check():
         "status": "healthy",
         "message": "Legal AI Analysis API is operational",
         "timestamp": datetime.now().isoformat(),
+        "ready": pipeline_ready.is_set(),
         "ai_enabled": gemini_analyzer is not None,
+        "result_cache": result_cache.stats() if result_cache else None,
+        "clause_cache": gemini_analyzer.clause_cache_stats() if gemini_analyzer else None,
+        "gemini": gemini_analyzer.scheduler.stats() if gemini_analyzer else None,
+        "triage": gemini_analyzer.triage_stats() if gemini_analyzer else None,
+        "page_cache": page_cache_stats(),
+        "jobs": job_scheduler.stats() if job_scheduler else None,
         "version": "3.0.0"
     }
 
-@app.post("/analyze-legal-document")
-async def analyze_legal_document(files: List[UploadFile] = File(...)):
-    """
-    Analyze legal documents with AI and return results immediately.
-    No user tracking, no storage - just pure AI analysis.
-    
-    Returns format: {"clause": "text", "risk": "High/Medium/Low", "laws": "laws", "summary": "summary"}
-    """
-    
-    # Validate inputs
+def format_timings(stage_timings: dict) -> dict:
+    """Per-stage seconds for a response, slowest stage first"""
+    return {
+        stage: round(seconds, 4)
+        for stage, seconds in sorted(stage_timings.items(), key=lambda item: item[1], reverse=True)
+    }
+
+def to_legal_item(analysis: dict) -> dict:
+    """Convert a Gemini clause analysis to the response format"""
+    return {
+        "clause": analysis.get("clause", ""),
+        "risk": analysis.get("risk", "Medium"),
+        "laws": analysis.get("laws", ""),
+        "summary": analysis.get("summary", "")
+    }
+
+async def validate_upload_request(files: List[UploadFile]) -> None:
+    """Reject requests without PDFs or without a configured analyzer (once the warm-up has finished)"""
     if not files:
         raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(files) > settings.MAX_FILES_PER_REQUEST:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {settings.MAX_FILES_PER_REQUEST} files allowed per request"
+        )
     
     for file in files:
         if not file.filename.lower().endswith('.pdf'):
@@ -80,69 +271,207 @@ async def analyze_legal_document(files: List[UploadFile] = File(...)):
                 detail=f"File {file.filename} is not a PDF"
             )
     
+    await pipeline_ready.wait()
     if not gemini_analyzer:
         raise HTTPException(
             status_code=503, 
             detail="AI analysis service unavailable - Gemini API not configured"
         )
+
+async def save_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Stream one upload to a temporary file in chunks, hashing it on the way
+    and enforcing MAX_FILE_SIZE, so the whole file is never held in memory.
+    Returns the saved file path and its content hash.
+    """
+    digest = hashlib.sha256()
+    size = 0
     
-    temp_dir = None
+    with tempfile.NamedTemporaryFile(
+        dir=settings.TEMP_DIR,
+        prefix="upload_",
+        suffix=f"_{os.path.basename(file.filename)}",
+        delete=False
+    ) as temp_file:
+        file_path = temp_file.name
     
     try:
-        # Create temporary directory
-        temp_dir = tempfile.mkdtemp(prefix=f"legal_analysis_")
-        
-        # Process each file
-        all_legal_analyses = []
-        processed_files = []
-        
+        async with aiofiles.open(file_path, 'wb') as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File {file.filename} exceeds the {format_size(settings.MAX_FILE_SIZE)} limit"
+                    )
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        os.unlink(file_path)
+        raise
+    
+    return file_path, digest.hexdigest()
+
+async def save_uploads(files: List[UploadFile]) -> Tuple[List[str], List[str]]:
+    """
+    Save uploaded files to TEMP_DIR
+    Returns the saved file paths and their content hashes, in upload order
+    """
+    file_paths = []
+    file_hashes = []
+    try:
         for file in files:
-            file_path = os.path.join(temp_dir, file.filename)
+            file_path, file_hash = await save_upload(file)
+            file_paths.append(file_path)
+            file_hashes.append(file_hash)
+    except BaseException:
+        remove_saved_uploads(file_paths)
+        raise
+    
+    return file_paths, file_hashes
+
+def remove_saved_uploads(file_paths: List[str]) -> None:
+    """Delete saved uploads, unless CLEANUP_TEMP_FILES is turned off"""
+    if not settings.CLEANUP_TEMP_FILES:
+        return
+    for file_path in file_paths:
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+
+def build_analysis_summary(filenames: List[str], results: List[Optional[List[dict]]]) -> dict:
+    """Summarize per-file results (in upload order) into the response body"""
+    all_legal_analyses = []
+    processed_files = []
+    for filename, legal_items in zip(filenames, results):
+        if legal_items is None:
+            continue
+        all_legal_analyses.extend(legal_items)
+        processed_files.append(filename)
+    
+    return {
+        "status": "completed",
+        "message": f"Successfully analyzed {len(processed_files)} legal documents",
+        "files": processed_files,
+        "total_documents": len(processed_files),
+        "total_clauses_analyzed": len(all_legal_analyses),
+        "legal_analysis": all_legal_analyses,
+        "analyzed_at": datetime.now().isoformat()
+    }
+
+async def analyze_uploaded_file(file_path: str, filename: str, file_hash: str,
+                                emit: Optional[Callable[[dict], None]] = None) -> Optional[List[dict]]:
+    """
+    Extract and analyze one saved PDF, reusing cached results for identical files.
+    Returns its legal items, or None when the file is skipped or fails.
+    
+    If emit is given, progress events are passed to it while the file is
+    processed: one per page, one when the text is ready and one per clause.
+    """
+    from gemini_service import PROMPT_VERSION
+    from text_extractor import extract_pages_report
+    
+    def send(event: str, **data):
+        if emit:
+            emit({"event": event, "file": filename, **data})
+    
+    cache_key = make_cache_key(file_hash, gemini_analyzer.model_name, PROMPT_VERSION, f"triage={gemini_analyzer.triage}")
+    if result_cache:
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            for legal_item in cached:
+                send("clause", cached=True, **legal_item)
+            send("file_done", clauses=len(cached), cached=True)
+            return cached
+    
+    async with file_semaphore:
+        try:
+            loop = asyncio.get_running_loop()
+            
+            # Page callbacks run on the extraction thread - hop back to the loop
+            on_page = None
+            if emit:
+                on_page = lambda page: loop.call_soon_threadsafe(
+                    lambda: send("page", page=page["page"], source=page["source"], seconds=page["seconds"])
+                )
+            
+            # Run in a copy of this context so extraction stages reach the request's timings
+            context = contextvars.copy_context()
+            page_texts, pages = await loop.run_in_executor(
+                extraction_executor, context.run, extract_pages_report, file_path, on_page
+            )
+            
+            # Drop headers/footers, page numbers and OCR noise before they cost tokens
+            with span("compaction"):
+                extracted_text, compaction = compact_pages(page_texts)
+            
+            if not extracted_text or len(extracted_text.strip()) < 50:
+                send("file_skipped", reason="insufficient text")
+                return None  # Skip files with insufficient text
             
-            # Save uploaded file
-            content = await file.read()
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(content)
+            print(f"🗜️ {filename}: prompt compacted from ~{compaction['tokens_before']} to ~{compaction['tokens_after']} tokens")
+            send("text_ready", pages=len(pages), characters=len(extracted_text), **compaction)
             
-            # Extract text from PDF
-            try:
-                extracted_text = extract_text_fast(file_path)
-                
-                if not extracted_text or len(extracted_text.strip()) < 50:
-                    continue  # Skip files with insufficient text
-                
-                # Analyze with Gemini AI
-                clause_analyses = gemini_analyzer.analyze_legal_document(
+            # Analyze with Gemini AI, streaming clauses out as each chunk is parsed;
+            # the result (and what gets cached) is the document-ordered list
+            if emit:
+                clause_analyses = []
+                async for analysis in gemini_analyzer.iter_document_analysis_async(
+                    extracted_text, "Legal Document", ordered=clause_analyses
+                ):
+                    send("clause", **to_legal_item(analysis))
+            else:
+                clause_analyses = await gemini_analyzer.analyze_legal_document_async(
                     extracted_text, 
                     "Legal Document"
                 )
-                
-                # Convert to requested format
-                for analysis in clause_analyses:
-                    legal_item = {
-                        "clause": analysis.get("clause", ""),
-                        "risk": analysis.get("risk", "Medium"),
-                        "laws": analysis.get("laws", ""),
-                        "summary": analysis.get("summary", "")
-                    }
-                    all_legal_analyses.append(legal_item)
-                
-                processed_files.append(file.filename)
-                
-            except Exception as e:
-                print(f"Error processing {file.filename}: {str(e)}")
-                continue
+            
+            # Convert to requested format
+            legal_items = [to_legal_item(analysis) for analysis in clause_analyses]
+            
+            # Failed analyses are not cached so the next upload retries them
+            if result_cache and not any(analysis.get("error") for analysis in clause_analyses):
+                result_cache.set(cache_key, legal_items)
+            
+            send("file_done", clauses=len(legal_items))
+            return legal_items
+            
+        except Exception as e:
+            print(f"Error processing {filename}: {str(e)}")
+            send("file_error", detail=str(e))
+            return None
+
+@app.post("/analyze-legal-document")
+async def analyze_legal_document(files: List[UploadFile] = File(...), timings: bool = False):
+    """
+    Analyze legal documents with AI and return results immediately.
+    No user tracking, no storage - just pure AI analysis.
+    
+    Returns format: {"clause": "text", "risk": "High/Medium/Low", "laws": "laws", "summary": "summary"}
+    With timings=true the response also has "timings": seconds spent per pipeline stage.
+    """
+    await validate_upload_request(files)
+    
+    file_paths = []
+    
+    try:
+        with collect_timings() as stage_timings:
+            with span("upload"):
+                file_paths, file_hashes = await save_uploads(files)
+            
+            # Process files concurrently - OCR of one file overlaps the Gemini
+            # round-trip of another; gather keeps results in upload order
+            results = await asyncio.gather(*(
+                analyze_uploaded_file(file_path, file.filename, file_hash)
+                for file, file_path, file_hash in zip(files, file_paths, file_hashes)
+            ))
         
         # Return immediate results (no storage)
-        return {
-            "status": "completed",
-            "message": f"Successfully analyzed {len(processed_files)} legal documents",
-            "files": processed_files,
-            "total_documents": len(processed_files),
-            "total_clauses_analyzed": len(all_legal_analyses),
-            "legal_analysis": all_legal_analyses,
-            "analyzed_at": datetime.now().isoformat()
-        }
+        summary = build_analysis_summary([file.filename for file in files], results)
+        if timings:
+            summary["timings"] = format_timings(stage_timings)
+        return summary
         
     except HTTPException:
         raise
@@ -151,8 +480,240 @@ async def analyze_legal_document(files: List[UploadFile] = File(...)):
         
     finally:
         # Cleanup temporary files
-        if temp_dir and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir, ignore_errors=True)
+        remove_saved_uploads(file_paths)
+
+@app.post("/analyze-legal-document/stream")
+async def analyze_legal_document_stream(files: List[UploadFile] = File(...), format: str = "ndjson",
+                                        timings: bool = False):
+    """
+    Streaming variant of /analyze-legal-document.
+    Emits one JSON event per line (format=ndjson) or server-sent events
+    (format=sse) while the files are processed:
+    
+    page, text_ready, clause, file_done / file_skipped / file_error per file,
+    then a final "done" event with the same summary as the regular endpoint
+    (minus legal_analysis, which has already been streamed clause by clause).
+    Clause events carry the same {"clause", "risk", "laws", "summary"} fields.
+    With timings=true the "done" event also has the per-stage breakdown.
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    
+    await validate_upload_request(files)
+    
+    # Files must be saved before returning - uploads are closed once the response starts
+    try:
+        file_paths, file_hashes = await save_uploads(files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    
+    filenames = [file.filename for file in files]
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def run_analysis():
+        try:
+            with collect_timings() as stage_timings:
+                results = await asyncio.gather(*(
+                    analyze_uploaded_file(file_path, filename, file_hash, emit=queue.put_nowait)
+                    for filename, file_path, file_hash in zip(filenames, file_paths, file_hashes)
+                ))
+            summary = build_analysis_summary(filenames, results)
+            summary.pop("legal_analysis")
+            if timings:
+                summary["timings"] = format_timings(stage_timings)
+            queue.put_nowait({"event": "done", **summary})
+        except Exception as e:
+            queue.put_nowait({"event": "error", "detail": f"Analysis failed: {str(e)}"})
+        finally:
+            queue.put_nowait(None)
+    
+    def encode(event: dict) -> str:
+        payload = json.dumps(event)
+        if format == "sse":
+            return f"event: {event['event']}\ndata: {payload}\n\n"
+        return payload + "\n"
+    
+    async def event_stream():
+        task = asyncio.create_task(run_analysis())
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield encode(event)
+        finally:
+            # Client disconnected or stream finished - stop work and clean up
+            task.cancel()
+            remove_saved_uploads(file_paths)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(event_stream(), media_type=media_type)
+
+async def run_analysis_job(job_id: str, payload: dict) -> dict:
+    """Job handler: analyze the saved files, recording clauses as they arrive"""
+    filenames = payload["filenames"]
+    files_done = 0
+    
+    def record(event: dict):
+        nonlocal files_done
+        if event["event"] == "clause":
+            legal_item = {key: event[key] for key in ("clause", "risk", "laws", "summary")}
+            job_store.append_clauses(job_id, [legal_item])
+        elif event["event"] in ("file_done", "file_skipped", "file_error"):
+            files_done += 1
+            job_store.update(job_id, files_done=files_done)
+    
+    results = await asyncio.gather(*(
+        analyze_uploaded_file(file_path, filename, file_hash, emit=record)
+        for filename, file_path, file_hash in zip(filenames, payload["file_paths"], payload["file_hashes"])
+    ))
+    summary = build_analysis_summary(filenames, results)
+    # Replace the partial, completion-ordered clauses with the final upload-ordered list
+    job_store.update(job_id, legal_analysis=summary.pop("legal_analysis"))
+    return summary
+
+def cleanup_job_files(payload: dict) -> None:
+    """Remove a job's saved uploads once it has finished"""
+    remove_saved_uploads(payload["file_paths"])
+
+# Background jobs - uploads return a job id immediately and are polled for results.
+# Built by create_job_scheduler() at startup, in the worker process that serves them
+job_store = None
+job_scheduler = None
+
+def create_job_scheduler() -> None:
+    """Open the job store and build the scheduler that runs this worker's jobs"""
+    global job_store, job_scheduler
+    if settings.JOB_STORE_BACKEND == "sqlite":
+        job_store = SQLiteJobStore(
+            settings.JOB_STORE_PATH,
+            retention_seconds=settings.JOB_RETENTION,
+            heartbeat_timeout=settings.JOB_HEARTBEAT_TIMEOUT
+        )
+    else:
+        job_store = InMemoryJobStore(retention_seconds=settings.JOB_RETENTION)
+    
+    job_scheduler = JobScheduler(
+        job_store,
+        run_analysis_job,
+        max_concurrent=settings.MAX_CONCURRENT_JOBS,
+        max_queued=settings.JOB_QUEUE_MAX_SIZE,
+        timeout=settings.JOB_TIMEOUT,
+        cleanup=cleanup_job_files
+    )
+
+@app.post("/jobs", status_code=202)
+async def submit_analysis_job(files: List[UploadFile] = File(...)):
+    """
+    Queue legal documents for background analysis and return a job id right away.
+    Poll GET /jobs/{job_id} for status and partial or final results.
+    """
+    await validate_upload_request(files)
+    
+    if job_scheduler.draining:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is shutting down - please retry",
+            headers={"Retry-After": "5"}
+        )
+    
+    # Reject before reading the uploads when there's no room in the queue
+    if job_scheduler.is_full():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queued jobs - please retry later",
+            headers={"Retry-After": "30"}
+        )
+    
+    try:
+        file_paths, file_hashes = await save_uploads(files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    filenames = [file.filename for file in files]
+    job = new_job_record(filenames)
+    payload = {
+        "filenames": filenames,
+        "file_paths": file_paths,
+        "file_hashes": file_hashes
+    }
+    
+    try:
+        job_scheduler.submit(job, payload)
+    except QueueFullError:
+        cleanup_job_files(payload)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queued jobs - please retry later",
+            headers={"Retry-After": "30"}
+        )
+    
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "files": filenames,
+        "queue_depth": job_scheduler.queue_depth()
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """
+    Job status with the clauses analyzed so far; "result" holds the
+    final summary once the job has completed
+    """
+    job = job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    job.pop("owner", None)
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def cancel_analysis_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if not job_scheduler.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} already {job['status']}")
+    return {"job_id": job_id, "status": "cancelled"}
+
+class ClauseAnalysisRequest(BaseModel):
+    clauses: List[str]
+    context: str = ""
+
+@app.post("/analyze-clauses")
+async def analyze_clauses(request: ClauseAnalysisRequest):
+    """
+    Analyze a list of clauses (e.g. drill-down from the review UI).
+    Clauses are packed into as few Gemini calls as the token budget allows.
+    
+    Returns the analyses in the order the clauses were sent
+    """
+    await pipeline_ready.wait()
+    if not gemini_analyzer:
+        raise HTTPException(status_code=503, detail="AI analysis service unavailable - Gemini API not configured")
+    clauses = [clause.strip() for clause in request.clauses if clause.strip()]
+    if not clauses:
+        raise HTTPException(status_code=400, detail="No clauses provided")
+    if len(clauses) > settings.MAX_CLAUSES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"Maximum {settings.MAX_CLAUSES_PER_REQUEST} clauses allowed per request")
+    
+    analyses = await gemini_analyzer.analyze_clauses_async(clauses, request.context)
+    return {
+        "success": True,
+        "total_clauses": len(analyses),
+        "legal_analysis": [to_legal_item(analysis) for analysis in analyses],
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage latency histograms and Gemini/parse counters in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -164,15 +725,22 @@ async def root():
         "ai_enabled": gemini_analyzer is not None,
         "endpoints": [
             "/health - Health check",
-            "/analyze-legal-document - AI analysis of legal documents (no user tracking)"
+            "/metrics - Per-stage latency histograms and counters (Prometheus text format)",
+            "/analyze-legal-document - AI analysis of legal documents (no user tracking)",
+            "/analyze-legal-document/stream - Same analysis streamed as NDJSON or SSE progress events",
+            "/jobs - Queue documents for background analysis (GET/DELETE /jobs/{job_id} to poll or cancel)",
+            "/analyze-clauses - Batched analysis of individual clauses"
         ]
     }
 
 if __name__ == "__main__":
     import uvicorn
+    check_worker_settings()
     uvicorn.run(
         "api:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
+        host=settings.API_HOST,
+        port=settings.API_PORT,
+        workers=settings.WEB_CONCURRENCY,
+        reload=settings.DEBUG,  # reload runs a single worker
+        timeout_graceful_shutdown=settings.SHUTDOWN_DRAIN_TIMEOUT
     )
@@ -0,0 +1,132 @@
+"""
+Benchmark extract_text_fast on the synthetic corpus
+Reports pages/sec and peak resident memory of the server process and of the
+OCR pool workers for each document kind and size. The page cache is off so
+every run does the full work; the OCR pool is started before timing.
+
+Usage:
+    python benchmarks/bench_extraction.py [--kinds born_digital,scanned,tables]
+        [--pages 1,10,100,500] [--corpus corpus] [--repeat 1] [--output results.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+os.environ.setdefault("PAGE_CACHE_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import DEFAULT_PAGE_COUNTS, KINDS
+from config import settings
+from text_extractor import extract_text_fast, get_ocr_pool, shutdown_ocr_pool, warm_ocr_pool
+
+def rss_mb(pid) -> float:
+    """Resident memory of a process in MB (Linux /proc), 0 when unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+class MemorySampler:
+    """Track peak RSS of this process and, separately, the sum over the OCR workers"""
+
+    def __init__(self, pool, interval: float = 0.02):
+        self.pool = pool
+        self.interval = interval
+        self.peak_main = 0.0
+        self.peak_workers = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak_main = max(self.peak_main, rss_mb(os.getpid()))
+        workers = getattr(self.pool, "_processes", None) or {}
+        self.peak_workers = max(self.peak_workers, sum(rss_mb(pid) for pid in list(workers)))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+def bench_document(path: str, pages: int, repeat: int) -> dict:
+    pool = get_ocr_pool()
+    times = []
+    with MemorySampler(pool) as memory:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # per-file extraction report
+                text = extract_text_fast(path)
+            times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        "seconds": round(best, 3),
+        "pages_per_sec": round(pages / best, 2),
+        "characters": len(text),
+        "peak_rss_mb": round(memory.peak_main, 1),
+        "peak_worker_rss_mb": round(memory.peak_workers, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--pages", default=",".join(map(str, DEFAULT_PAGE_COUNTS)))
+    parser.add_argument("--corpus", default="corpus", help="directory for the generated PDFs")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per document; the fastest is reported")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    # Generated in a child process, so rendering the scans doesn't inflate this process's RSS
+    corpus = json.loads(subprocess.run(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.py"),
+         "--out", args.corpus, "--kinds", args.kinds, "--pages", args.pages],
+        check=True, capture_output=True, text=True,
+    ).stdout)["corpus"]
+
+    # Spawning the workers is a one-off cost, not per-document throughput
+    warm_ocr_pool()
+
+    results = []
+    try:
+        for entry in corpus:
+            results.append({"kind": entry["kind"], "pages": entry["pages"],
+                            **bench_document(entry["path"], entry["pages"], args.repeat)})
+    finally:
+        shutdown_ocr_pool()
+
+    report = json.dumps({
+        "benchmark": "extraction",
+        "ocr_workers": settings.OCR_WORKERS,
+        "ocr_mode": settings.OCR_MODE,
+        "ocr_memory_budget_mb": settings.OCR_MEMORY_BUDGET_MB,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "results": results,
+    }, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    main()
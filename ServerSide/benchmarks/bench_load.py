@@ -0,0 +1,212 @@
+"""
+Load-test POST /analyze-legal-document against the fake Gemini backend
+Starts the API with uvicorn on a local port (GEMINI_BACKEND=fake, so no API
+key or network is needed), sends concurrent uploads from the synthetic
+corpus and reports latency percentiles, throughput, status codes and the
+server's Gemini call outcomes scraped from /metrics. Result, clause and page
+caches are off, and each upload carries its own payment reference so identical
+prompts are not coalesced, so every request does the full work (pass
+--identical to send the same bytes every time and measure coalescing instead).
+
+Usage:
+    python benchmarks/bench_load.py [--requests 20] [--concurrency 5]
+        [--kind born_digital] [--pages 10] [--latency 0.5] [--rate-429 0.1]
+        [--rpm 600] [--identical] [--url http://host:port] [--output results.json]
+
+With --url an already running server is targeted and the fake-backend
+options are ignored (configure that server with the GEMINI_* variables).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+import fitz  # PyMuPDF
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import KINDS, write_corpus
+
+METRIC_LINE = re.compile(r'^(legal_ai_\w+)\{(\w+)="([^"]*)"\} (\S+)$')
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int, args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "GEMINI_BACKEND": "fake",
+        "GEMINI_FAKE_LATENCY": str(args.latency),
+        "GEMINI_FAKE_429_RATE": str(args.rate_429),
+        "GEMINI_RPM": str(args.rpm),
+        "GEMINI_BACKOFF_BASE": str(args.backoff_base),
+        "RESULT_CACHE_ENABLED": "false",
+        "CLAUSE_CACHE_ENABLED": "false",
+        "PAGE_CACHE_ENABLED": "false",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    """Wait for /health to report the warm-up finished, not just for the server to answer"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/health")
+            if response.status_code == 200 and response.json().get("ready"):
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("Server did not become ready")
+
+async def scrape_metrics(client: httpx.AsyncClient) -> dict:
+    """Labelled counters and stage sums from /metrics, keyed "metric:label" """
+    values = {}
+    for line in (await client.get("/metrics")).text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, _, label, value = match.groups()
+            values[f"{name}:{label}"] = float(value)
+        elif line.startswith("legal_ai_stage_seconds_sum"):
+            stage = line.split('stage="')[1].split('"')[0]
+            values[f"legal_ai_stage_seconds_sum:{stage}"] = float(line.rsplit(" ", 1)[1])
+    return values
+
+def metric_delta(before: dict, after: dict, prefix: str) -> dict:
+    return {
+        key.split(":", 1)[1]: round(after[key] - before.get(key, 0), 3)
+        for key in sorted(after) if key.startswith(prefix + ":") and after[key] != before.get(key, 0)
+    }
+
+def unique_variant(payload: bytes, index: int) -> bytes:
+    """
+    The same document with a payment reference line on every page that makes each upload distinct.
+    It is worded as a payment clause so triage keeps it in every prompt chunk, and differs
+    per page (letters, not just digits) so compaction doesn't strip it as a running header.
+    """
+    doc = fitz.open(stream=payload, filetype="pdf")
+    nonce = time.time_ns()
+    for number, page in enumerate(doc):
+        reference = hashlib.sha1(f"{index}-{number}-{nonce}".encode()).hexdigest()[:12]
+        page.insert_text((60, 25), f"All payments under this page shall quote invoice reference {reference}.", fontsize=8)
+    variant = doc.tobytes()
+    doc.close()
+    return variant
+
+def percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+async def run_load(client: httpx.AsyncClient, path: str, requests: int, concurrency: int, identical: bool):
+    with open(path, "rb") as f:
+        payload = f.read()
+    uploads = [payload if identical else unique_variant(payload, index) for index in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses, clauses = [], {}, 0
+
+    async def one(index: int):
+        nonlocal clauses
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/analyze-legal-document",
+                    files={"files": (f"contract_{index}.pdf", uploads[index], "application/pdf")},
+                )
+                status = str(response.status_code)
+                if response.status_code == 200:
+                    clauses += response.json().get("total_clauses_analyzed", 0)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    return time.perf_counter() - start, latencies, statuses, clauses
+
+async def bench(args) -> dict:
+    corpus = write_corpus(args.corpus, [args.kind], [args.pages])
+    server = None
+    url = args.url
+    if not url:
+        port = free_port()
+        server = start_server(port, args)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=args.timeout) as client:
+            await wait_until_ready(client)
+            before = await scrape_metrics(client)
+            elapsed, latencies, statuses, clauses = await run_load(
+                client, corpus[0]["path"], args.requests, args.concurrency, args.identical
+            )
+            after = await scrape_metrics(client)
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        "benchmark": "load",
+        "url": args.url or "local fake backend",
+        "fake_gemini": None if args.url else {
+            "latency": args.latency, "rate_429": args.rate_429, "rpm": args.rpm,
+        },
+        "document": {"kind": args.kind, "pages": args.pages, "identical": args.identical},
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(args.requests / elapsed, 2),
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 0.5), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "status_codes": statuses,
+        "clauses_analyzed": clauses,
+        "gemini_calls": metric_delta(before, after, "legal_ai_gemini_calls_total"),
+        "response_parse": metric_delta(before, after, "legal_ai_response_parse_total"),
+        "stage_seconds": metric_delta(before, after, "legal_ai_stage_seconds_sum"),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--kind", default="born_digital", choices=KINDS)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--corpus", default="corpus", help="directory for the generated PDFs")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake Gemini seconds per call")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of fake Gemini calls answered with 429")
+    parser.add_argument("--rpm", type=int, default=600, help="GEMINI_RPM for the local server")
+    parser.add_argument("--backoff-base", type=float, default=0.2, help="GEMINI_BACKOFF_BASE for the local server")
+    parser.add_argument("--identical", action="store_true", help="send the same bytes every time")
+    parser.add_argument("--timeout", type=float, default=300, help="client timeout per request")
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(bench(args)), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    main()
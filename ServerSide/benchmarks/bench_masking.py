@@ -0,0 +1,114 @@
+"""
+Benchmark the table/box masking stage of process_page
+Compares the original RGB -> PIL -> BGR -> GRAY + per-contour loop pipeline
+with the grayscale zero-copy + vectorized box filtering one.
+OCR is not included - only rendering and masking are timed.
+
+Usage:
+    python benchmarks/bench_masking.py [--pages 20] [--dpi 150]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_extractor import detect_boxes, mask_boxes, render_page_gray
+
+def make_document(pages):
+    """Synthetic contract pages: running text, a ruled table and a boxed note"""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        y = 60
+        for line in range(18):
+            page.insert_text((60, y), f"{number + 1}.{line + 1} The Supplier shall deliver the Services in accordance with Schedule {line}.", fontsize=10)
+            y += 16
+        # Ruled table
+        top = y + 20
+        for row in range(7):
+            page.draw_line((60, top + row * 24), (540, top + row * 24))
+        for col in range(5):
+            page.draw_line((60 + col * 120, top), (60 + col * 120, top + 144))
+        for row in range(6):
+            for col in range(4):
+                page.insert_text((66 + col * 120, top + 16 + row * 24), f"Item {row}-{col}", fontsize=9)
+        # Boxed note
+        page.draw_rect(fitz.Rect(60, top + 180, 540, top + 240), color=(0, 0, 0))
+        page.insert_text((70, top + 205), "Note: fees are exclusive of applicable taxes.", fontsize=10)
+    return doc
+
+def legacy_mask(page, dpi):
+    """The original process_page masking stage"""
+    pix = page.get_pixmap(dpi=dpi)
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    image = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    edged = cv2.Canny(blur, 30, 50)
+    contours, _ = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mask = np.ones(gray.shape, dtype="uint8") * 255
+    for cnt in contours:
+        x, y, w, h = cv2.boundingRect(cnt)
+        if w > 50 and h > 30:
+            cv2.rectangle(mask, (x, y), (x + w, y + h), 0, -1)
+    return cv2.bitwise_and(gray, gray, mask=mask)
+
+def current_mask(page, dpi):
+    """The current process_page masking stage"""
+    pix, gray = render_page_gray(page, dpi=dpi)
+    mask_boxes(gray, detect_boxes(gray, dpi=dpi))
+    return gray.copy()  # detach from the pixmap so both variants return an owned array
+
+def run(variant, doc, dpi):
+    times = []
+    peaks = []
+    for page in doc:
+        tracemalloc.start()
+        start = time.perf_counter()
+        variant(page, dpi)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "ms_per_page": round(1000 * sum(times) / len(times), 2),
+        "ms_per_page_min": round(1000 * min(times), 2),
+        "peak_mb_per_page": round(max(peaks) / 1e6, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--dpi", type=int, default=150)
+    args = parser.parse_args()
+
+    doc = make_document(args.pages)
+
+    # Both variants should blank out the same area
+    legacy = legacy_mask(doc[0], args.dpi)
+    current = current_mask(doc[0], args.dpi)
+    agreement = float(np.mean((legacy == 0) == (current == 0)))
+
+    legacy_stats = run(legacy_mask, doc, args.dpi)
+    current_stats = run(current_mask, doc, args.dpi)
+    print(json.dumps({
+        "benchmark": "masking",
+        "pages": args.pages,
+        "dpi": args.dpi,
+        "legacy": legacy_stats,
+        "current": current_stats,
+        "speedup": round(legacy_stats["ms_per_page"] / current_stats["ms_per_page"], 2),
+        "mask_agreement": round(agreement, 4),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark per-page OCR overhead of the available OCR backends
+pytesseract starts a tesseract process per call; tesserocr keeps one engine
+loaded in-process. The fixed cost is measured on a tiny blank image, the
+full cost on synthetic contract pages rendered like process_page does.
+
+Usage:
+    python benchmarks/bench_ocr_backends.py [--pages 5] [--calls 20]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_masking import make_document
+from text_extractor import PytesseractBackend, TesserocrBackend, detect_boxes, mask_boxes, render_page_gray
+
+def available_backends():
+    """Instantiate every backend that works here; report why the others don't"""
+    backends, skipped = [], {}
+    if shutil.which("tesseract"):
+        backends.append(PytesseractBackend())
+    else:
+        skipped["pytesseract"] = "tesseract binary not on PATH"
+    try:
+        backends.append(TesserocrBackend())
+    except Exception as e:
+        skipped["tesserocr"] = str(e)
+    return backends, skipped
+
+def time_calls(backend, image, calls, psm):
+    start = time.perf_counter()
+    for _ in range(calls):
+        backend.image_to_string(image, psm=psm, dpi=150)
+    return 1000 * (time.perf_counter() - start) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=20, help="calls used to measure fixed overhead")
+    args = parser.parse_args()
+
+    doc = make_document(args.pages)
+    pages = []
+    for page in doc:
+        pix, gray = render_page_gray(page, dpi=150)
+        mask_boxes(gray, detect_boxes(gray, dpi=150))
+        pages.append(gray.copy())
+    blank = np.full((32, 32), 255, dtype=np.uint8)
+
+    backends, skipped = available_backends()
+    results = {}
+    for backend in backends:
+        backend.image_to_string(blank, psm=11)  # warm-up: first engine load isn't per-page cost
+        start = time.perf_counter()
+        for image in pages:
+            backend.image_to_string(image, psm=11, dpi=150)
+        ms_per_page = 1000 * (time.perf_counter() - start) / len(pages)
+        results[backend.name] = {
+            "overhead_ms_per_call": round(time_calls(backend, blank, args.calls, psm=11), 2),
+            "ms_per_page": round(ms_per_page, 2),
+        }
+
+    print(json.dumps({
+        "benchmark": "ocr_backends",
+        "pages": args.pages,
+        "results": results,
+        "skipped": skipped,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Synthetic contract corpus for the extraction and load benchmarks
+Every page has different clause text, so page and result caches never hit
+by accident across pages or documents.
+
+Kinds:
+    born_digital - text layer only, no OCR needed
+    scanned      - each page is an image of a rendered page, no text layer
+    tables       - ruled tables and boxed notes (bench_masking.make_document)
+
+Usage:
+    python benchmarks/corpus.py --out corpus [--kinds born_digital,scanned] [--pages 1,10,100,500]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_masking import make_document
+
+KINDS = ("born_digital", "scanned", "tables")
+DEFAULT_PAGE_COUNTS = (1, 10, 100, 500)
+
+# Mix of clauses the triage step sends to Gemini and ones it answers locally
+CLAUSE_TEMPLATES = (
+    "The Customer shall pay each invoice within {n} days of receipt; late payments accrue interest at {m}% per month.",
+    "Either party may terminate this Agreement upon {n} days written notice if the other party materially breaches it.",
+    "The Supplier shall indemnify the Customer against all losses and damages arising from claims under Schedule {m}.",
+    "In no event shall either party's aggregate liability exceed the fees paid in the {n} months before the claim.",
+    "Each party shall keep the other party's Confidential Information confidential for {n} years after termination.",
+    "The Supplier warrants that the Services will be performed with reasonable skill and care for {n} months.",
+    "This Agreement is governed by the laws of England and the courts of London have exclusive jurisdiction.",
+    "The Supplier shall provide monthly progress reports to the Customer's project lead by day {n} of each month.",
+)
+
+def clause_text(page_number: int, index: int) -> str:
+    template = CLAUSE_TEMPLATES[(page_number + index) % len(CLAUSE_TEMPLATES)]
+    return f"{page_number + 1}.{index + 1} " + template.format(n=page_number + index + 7, m=index % 9 + 1)
+
+def make_born_digital(pages: int) -> fitz.Document:
+    """Contract pages with a text layer: running header, numbered clauses, page number footer"""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((60, 40), "MASTER SERVICES AGREEMENT - CONFIDENTIAL", fontsize=8)
+        body = "\n\n".join(clause_text(number, index) for index in range(8))
+        page.insert_textbox(fitz.Rect(60, 60, 540, 780), body, fontsize=10)
+        page.insert_text((290, 810), f"Page {number + 1} of {pages}", fontsize=8)
+    return doc
+
+def make_scanned(pages: int, dpi: int = 150) -> fitz.Document:
+    """The born-digital pages rasterized to grayscale images, so only OCR can read them"""
+    source = make_born_digital(pages)
+    doc = fitz.open()
+    for page in source:
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        scan = doc.new_page(width=page.rect.width, height=page.rect.height)
+        scan.insert_image(scan.rect, stream=pix.tobytes("png"))
+        pix = None
+    source.close()
+    return doc
+
+def make_contract(kind: str, pages: int) -> fitz.Document:
+    if kind == "born_digital":
+        return make_born_digital(pages)
+    if kind == "scanned":
+        return make_scanned(pages)
+    if kind == "tables":
+        return make_document(pages)
+    raise ValueError(f"Unknown corpus kind: {kind}")
+
+def write_corpus(directory: str, kinds=KINDS, page_counts=DEFAULT_PAGE_COUNTS):
+    """
+    Write one PDF per kind and page count, reusing files already generated
+
+    Returns:
+        List of {"kind", "pages", "path"} dicts
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for kind in kinds:
+        for pages in page_counts:
+            path = os.path.join(directory, f"{kind}_{pages}.pdf")
+            if not os.path.exists(path):
+                doc = make_contract(kind, pages)
+                doc.save(path, garbage=3, deflate=True)
+                doc.close()
+            corpus.append({"kind": kind, "pages": pages, "path": path})
+    return corpus
+
+def parse_list(value: str, cast=str):
+    return [cast(item) for item in value.split(",") if item]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="corpus")
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--pages", default=",".join(map(str, DEFAULT_PAGE_COUNTS)))
+    args = parser.parse_args()
+
+    corpus = write_corpus(args.out, parse_list(args.kinds), parse_list(args.pages, int))
+    for entry in corpus:
+        entry["bytes"] = os.path.getsize(entry["path"])
+    print(json.dumps({"corpus": corpus}, indent=2))
+
+if __name__ == "__main__":
+    main()
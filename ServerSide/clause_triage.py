@@ -0,0 +1,109 @@
+"""
+Heuristic clause triage before LLM analysis
+Tags each clause with the FOCUS AREAS of the analysis prompt using keyword
+indexes; only tagged clauses go to Gemini, while recitals, signature blocks,
+definitions and untagged boilerplate get a cheap local summary
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from document_chunker import split_into_clauses
+from prompt_compactor import merge_ocr_double_spacing
+
+# Focus areas of the analysis prompt and the terms that put a clause in them
+FOCUS_AREAS = {
+    "Payment terms and penalties": r"pay(ment|able|s)?|fees?|invoic\w*|price|interest|penalt(y|ies)|late charge|refund\w*|deposit|compensat\w*|remunerat\w*",
+    "Liability and indemnification clauses": r"liab(le|ility|ilities)|indemn\w*|hold harmless|damages|losses",
+    "Termination conditions": r"terminat\w*|cancel\w*|expir\w*|renew\w*|notice period",
+    "Intellectual property rights": r"intellectual property|copyright\w*|patent\w*|trademark\w*|licen[cs]\w*|proprietary|work product",
+    "Confidentiality agreements": r"confidential\w*|non-disclosure|trade secrets?|disclos\w*",
+    "Force majeure provisions": r"force majeure|acts? of god|beyond (its|their) (reasonable )?control",
+    "Dispute resolution mechanisms": r"disputes?|arbitrat\w*|mediat\w*|litigation|courts?",
+    "Warranties and representations": r"warrant\w*|represent(s|ations?)|guarantee\w*|as is",
+    "Limitation of liability": r"limitation of liability|in no event|consequential|shall not exceed|aggregate liability",
+    "Governing law and jurisdiction": r"governing law|governed by|jurisdiction|venue",
+}
+
+FOCUS_AREA_PATTERNS = {
+    area: re.compile(rf"\b({terms})\b", re.IGNORECASE) for area, terms in FOCUS_AREAS.items()
+}
+
+# Low-value segments, checked before focus-area tags
+RECITAL = re.compile(r"^\s*(whereas\b|recitals?\b|background\b|now,? therefore\b)", re.IGNORECASE)
+SIGNATURE = re.compile(
+    r"in witness whereof|^\s*(signed|signature|by|name|title|date|witness)\s*:",
+    re.IGNORECASE | re.MULTILINE,
+)
+DEFINITION = re.compile(
+    r"""^\s*(\d+(\.\d+)*[.)]?\s*)?(
+        ["“'‘][^"”'’]{1,60}["”'’]\s+(shall\s+)?(mean|means|has\s+the\s+meaning|includes?)\b
+      | definitions\b
+    )""",
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Headings, numbering and other fragments shorter than this are dropped
+MIN_TRIAGE_CHARS = 40
+
+LOCAL_SUMMARIES = {
+    "recital": "Recital or background statement describing the parties' intent; it creates no operative obligations.",
+    "signature": "Signature or execution block; confirm the signatories are authorised to bind their parties.",
+    "definition": "Definition of a term used elsewhere in the document; its effect depends on the clauses that use it.",
+    "general": "No payment, liability, termination or other focus-area terms detected; treated as standard language.",
+}
+
+def classify_clause(clause: str) -> Tuple[str, List[str]]:
+    """
+    Classify one clause
+
+    Returns:
+        Tuple of (kind, focus areas) where kind is "candidate" for clauses worth
+        an LLM review, or "recital", "signature", "definition" or "general"
+    """
+    if RECITAL.match(clause):
+        return "recital", []
+    if SIGNATURE.search(clause):
+        return "signature", []
+    if DEFINITION.match(clause):
+        return "definition", []
+    areas = [area for area, pattern in FOCUS_AREA_PATTERNS.items() if pattern.search(clause)]
+    return ("candidate" if areas else "general"), areas
+
+def local_analysis(clause: str, kind: str) -> Dict[str, Any]:
+    """Cheap analysis for a clause that is not sent to Gemini"""
+    return {
+        "clause": clause,
+        "risk": "Low",
+        "laws": "General contract law principles",
+        "summary": LOCAL_SUMMARIES[kind],
+        "analyzed_at": datetime.now().isoformat(),
+        "confidence": "low",
+        "triage": kind,
+    }
+
+def triage_clauses(text: str) -> Tuple[List[Tuple[int, str]], List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Split document text into clauses and decide which ones need an LLM review
+
+    Args:
+        text: Extracted document text
+
+    Returns:
+        Tuple of (candidates, local) - candidate clause texts, and local analyses
+        for the substantive clauses that were skipped, each paired with the
+        clause's segment index so results can be put back in document order
+    """
+    candidates = []
+    local = []
+    # Uncompacted OCR text would otherwise triage every wrapped line on its own
+    for position, clause in enumerate(split_into_clauses(merge_ocr_double_spacing(text))):
+        if len(clause) < MIN_TRIAGE_CHARS:
+            continue
+        kind, _ = classify_clause(clause)
+        if kind == "candidate":
+            candidates.append((position, clause))
+        else:
+            local.append((position, local_analysis(clause, kind)))
+    return candidates, local
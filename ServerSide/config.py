@@ -14,9 +14,17 @@ class Settings:
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", "8000"))
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+    WEB_CONCURRENCY: int = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))  # uvicorn worker processes
+    SHUTDOWN_DRAIN_TIMEOUT: int = int(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "30"))  # seconds to finish running work on shutdown
     
     # File Upload Configuration
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "50000000"))  # 50MB
+    MAX_FILES_PER_REQUEST: int = int(os.getenv("MAX_FILES_PER_REQUEST", "10"))
+    MULTIPART_OVERHEAD: int = 64 * 1024  # boundaries and part headers on top of the file bytes
+    # Whole upload body, checked on Content-Length; defaults to a full batch of maximum-size files
+    MAX_REQUEST_SIZE: int = int(os.getenv(
+        "MAX_REQUEST_SIZE", str(MAX_FILES_PER_REQUEST * MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+    ))
     ALLOWED_EXTENSIONS: list = [".pdf"]
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
     TEMP_DIR: str = os.getenv("TEMP_DIR", "temp")
@@ -24,17 +32,57 @@ class Settings:
     # Processing Configuration
     MAX_CONCURRENT_JOBS: int = int(os.getenv("MAX_CONCURRENT_JOBS", "5"))
     JOB_TIMEOUT: int = int(os.getenv("JOB_TIMEOUT", "300"))  # 5 minutes
+    JOB_QUEUE_MAX_SIZE: int = int(os.getenv("JOB_QUEUE_MAX_SIZE", "20"))  # 429 once this many jobs wait
+    JOB_STORE_BACKEND: str = os.getenv("JOB_STORE_BACKEND", "memory")  # memory | sqlite
+    JOB_STORE_PATH: str = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+    JOB_RETENTION: int = int(os.getenv("JOB_RETENTION", "3600"))  # keep finished jobs for 1 hour
+    JOB_HEARTBEAT_TIMEOUT: int = int(os.getenv("JOB_HEARTBEAT_TIMEOUT", "60"))  # sqlite store: a silent worker's jobs are failed after this
     CLEANUP_TEMP_FILES: bool = os.getenv("CLEANUP_TEMP_FILES", "true").lower() == "true"
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 4) // WEB_CONCURRENCY))))  # OCR process pool size, per API worker
+    EXTRACTION_THREADS: int = int(os.getenv("EXTRACTION_THREADS", "4"))  # keeps extraction off the event loop
     
     # Model Configuration
     MODEL_CACHE_DIR: str = os.getenv("MODEL_CACHE_DIR", "models")
     USE_LIGHTWEIGHT_MODELS: bool = os.getenv("USE_LIGHTWEIGHT_MODELS", "false").lower() == "true"
+    OCR_MODE: str = os.getenv("OCR_MODE", "fixed")  # fixed (150 DPI whole page) | adaptive (per-region DPI)
+    OCR_LOW_DPI: int = int(os.getenv("OCR_LOW_DPI", "72"))  # adaptive: region detection render
+    OCR_HIGH_DPI: int = int(os.getenv("OCR_HIGH_DPI", "300"))  # adaptive: upper bound for region renders
+    OCR_MEMORY_BUDGET_MB: int = int(os.getenv("OCR_MEMORY_BUDGET_MB", "1024"))  # per document: fewer parallel pages, then lower DPI (0 = off)
+    OCR_MIN_DPI: int = int(os.getenv("OCR_MIN_DPI", "100"))  # the memory budget never renders below this
+    OCR_BACKEND: str = os.getenv("OCR_BACKEND", "auto")  # auto | tesserocr | pytesseract
+    
+    # Result Cache Configuration
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+    RESULT_CACHE_TTL: int = int(os.getenv("RESULT_CACHE_TTL", "86400"))  # 24 hours
+    RESULT_CACHE_BACKEND: str = os.getenv("RESULT_CACHE_BACKEND", "memory")  # memory | sqlite
+    CLAUSE_CACHE_ENABLED: bool = os.getenv("CLAUSE_CACHE_ENABLED", "true").lower() == "true"
+    CLAUSE_CACHE_MAX_ENTRIES: int = int(os.getenv("CLAUSE_CACHE_MAX_ENTRIES", "5000"))
+    PAGE_CACHE_ENABLED: bool = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+    PAGE_CACHE_MAX_ENTRIES: int = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "5000"))
     
     # Google Gemini AI Configuration
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     ENABLE_GEMINI_ANALYSIS: bool = os.getenv("ENABLE_GEMINI_ANALYSIS", "true").lower() == "true"
     GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
     GEMINI_TEMPERATURE: float = float(os.getenv("GEMINI_TEMPERATURE", "0.1"))
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "6000"))  # per-chunk budget for long documents
+    MAX_PARALLEL_CHUNKS: int = int(os.getenv("MAX_PARALLEL_CHUNKS", "4"))
+    CLAUSE_BATCH_MAX_TOKENS: int = int(os.getenv("CLAUSE_BATCH_MAX_TOKENS", "4000"))  # clause text per batch call
+    CLAUSE_BATCH_MAX_ITEMS: int = int(os.getenv("CLAUSE_BATCH_MAX_ITEMS", "20"))  # bounds the batch response size
+    MAX_CLAUSES_PER_REQUEST: int = int(os.getenv("MAX_CLAUSES_PER_REQUEST", "100"))
+    TRIAGE_ENABLED: bool = os.getenv("TRIAGE_ENABLED", "true").lower() == "true"  # only focus-area clauses go to Gemini
+    GEMINI_JSON_MODE: bool = os.getenv("GEMINI_JSON_MODE", "true").lower() == "true"  # application/json responses
+    GEMINI_BACKEND: str = os.getenv("GEMINI_BACKEND", "google")  # google | fake (offline load testing)
+    GEMINI_RPM: int = int(os.getenv("GEMINI_RPM", "60"))  # requests per minute quota
+    GEMINI_TPM: int = int(os.getenv("GEMINI_TPM", "1000000"))  # input tokens per minute quota
+    GEMINI_MAX_RETRIES: int = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+    GEMINI_BACKOFF_BASE: float = float(os.getenv("GEMINI_BACKOFF_BASE", "1.0"))  # seconds, doubled per retry
+    GEMINI_BACKOFF_MAX: float = float(os.getenv("GEMINI_BACKOFF_MAX", "30"))
+    GEMINI_CALL_TIMEOUT: float = float(os.getenv("GEMINI_CALL_TIMEOUT", "60"))  # per attempt
+    GEMINI_DEADLINE: float = float(os.getenv("GEMINI_DEADLINE", "180"))  # per call, retries included
+    GEMINI_FAKE_LATENCY: float = float(os.getenv("GEMINI_FAKE_LATENCY", "0.5"))
+    GEMINI_FAKE_429_RATE: float = float(os.getenv("GEMINI_FAKE_429_RATE", "0"))
     
     # Authentication Configuration
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
@@ -44,8 +92,8 @@ class Settings:
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: str = os.getenv("LOG_FILE", "api.log")
     
-    def __init__(self):
-        # Create necessary directories
+    def ensure_directories(self):
+        """Create the working directories; called at server startup, not on import"""
         Path(self.UPLOAD_DIR).mkdir(exist_ok=True)
         Path(self.TEMP_DIR).mkdir(exist_ok=True)
         Path(self.MODEL_CACHE_DIR).mkdir(exist_ok=True)
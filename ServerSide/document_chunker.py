@@ -0,0 +1,119 @@
+"""
+Clause-aware chunking of extracted document text
+Splits long documents on section/clause boundaries into token-budgeted
+chunks that can be analyzed independently
+"""
+
+import re
+from typing import List
+
+# Rough token estimate for Gemini models (~4 characters per token)
+CHARS_PER_TOKEN = 4
+
+# Lines that start a new clause or section: "1.", "1.2", "12.3.4", "(a)",
+# "(iv)", "Section 5", "ARTICLE IV", "Clause 3", "Schedule A"
+CLAUSE_BOUNDARY = re.compile(
+    r"""^\s*(
+        \d+(\.\d+)*[.)]?\s+\S
+      | \([a-z0-9]{1,4}\)\s+\S
+      | (section|article|clause|schedule|annex|exhibit)\s+[\dA-Z]+\b
+    )""",
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# All-caps headings such as "GOVERNING LAW" (matched case-sensitively)
+HEADING = re.compile(r"^\s*[A-Z][A-Z0-9 ,&'()-]{3,}$")
+
+SENTENCE_END = re.compile(r"(?<=[.;:!?])\s+")
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of model tokens in text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def split_into_clauses(text: str) -> List[str]:
+    """
+    Split document text into clause/section segments.
+    A new segment starts at every numbered or headed line and at blank lines.
+    """
+    clauses = []
+    current = []
+
+    for line in text.splitlines():
+        starts_clause = CLAUSE_BOUNDARY.match(line) or HEADING.match(line)
+        if not line.strip() or starts_clause:
+            if current:
+                clauses.append("\n".join(current).strip())
+                current = []
+        if line.strip():
+            current.append(line.rstrip())
+
+    if current:
+        clauses.append("\n".join(current).strip())
+
+    return [clause for clause in clauses if clause]
+
+def _split_oversized(clause: str, max_tokens: int) -> List[str]:
+    """Split a single clause larger than the budget on sentence, then word, boundaries"""
+    pieces = []
+    current = ""
+
+    for sentence in SENTENCE_END.split(clause):
+        while estimate_tokens(sentence) > max_tokens:
+            # No usable sentence break - cut on the last space inside the budget
+            limit = max_tokens * CHARS_PER_TOKEN
+            cut = sentence.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Pack clauses into chunks of at most max_tokens estimated tokens,
+    never splitting a clause unless it is larger than a whole chunk
+
+    Args:
+        text: Extracted document text
+        max_tokens: Token budget per chunk
+
+    Returns:
+        List of chunk texts in document order
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for clause in split_into_clauses(text):
+        clause_tokens = estimate_tokens(clause)
+
+        if clause_tokens > max_tokens:
+            pieces = _split_oversized(clause, max_tokens)
+        else:
+            pieces = [clause]
+
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece) + 1  # +1 for the joining blank line
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+
+    return chunks
@@ -0,0 +1,427 @@
+"""
+Rate-limit-aware scheduling for Gemini calls
+Token-bucket limiting against the RPM/TPM quota, retries with exponential
+backoff and jitter, per-call deadlines and coalescing of identical in-flight
+prompts, in front of a real or fake (offline) Gemini backend
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from document_chunker import estimate_tokens, split_into_clauses
+from metrics import GEMINI_CALLS, GEMINI_TOKENS, record_stage, span
+from result_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: quota exhausted, server errors, upstream timeouts
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` tokens per minute.
+    Callers reserve tokens up front and are told how long to wait before using them,
+    so concurrent callers queue up behind each other instead of polling.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` tokens and return the seconds to wait until they are available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A single request larger than the whole bucket still gets through, just slowly
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+def record_token_usage(prompt: str, text: str, usage=None) -> None:
+    """Count prompt and response tokens, from the response's usage metadata when the SDK provides it"""
+    if usage is not None and getattr(usage, "prompt_token_count", None):
+        GEMINI_TOKENS.inc(usage.prompt_token_count, kind="prompt")
+        GEMINI_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, kind="response")
+    else:
+        GEMINI_TOKENS.inc(estimate_tokens(prompt), kind="prompt")
+        GEMINI_TOKENS.inc(estimate_tokens(text), kind="response")
+
+class RateLimitError(Exception):
+    """429 raised by the fake backend, shaped like google.api_core's ResourceExhausted"""
+    code = 429
+
+class GeminiBackend:
+    """Sends prompts to a google.generativeai GenerativeModel"""
+
+    name = "gemini"
+
+    def __init__(self, model):
+        self.model = model
+
+    def warm(self) -> None:
+        """
+        Create the SDK clients now rather than on the first request. Call from
+        the event loop thread - the async client binds to the running loop.
+        """
+        from google.generativeai import client
+        if getattr(self.model, "_client", "missing") is None:
+            self.model._client = client.get_default_generative_client()
+        if getattr(self.model, "_async_client", "missing") is None:
+            self.model._async_client = client.get_default_generative_async_client()
+
+    def generate(self, prompt: str) -> str:
+        response = self.model.generate_content(prompt)
+        record_token_usage(prompt, response.text, getattr(response, "usage_metadata", None))
+        return response.text
+
+    async def generate_async(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        record_token_usage(prompt, response.text, getattr(response, "usage_metadata", None))
+        return response.text
+
+    async def generate_stream_async(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        received = []
+        usage = None
+        async for chunk in response:
+            received.append(chunk.text)
+            usage = getattr(chunk, "usage_metadata", None) or usage  # reported on the last chunk
+            yield chunk.text
+        record_token_usage(prompt, "".join(received), usage)
+
+class FakeGeminiBackend:
+    """
+    Offline stand-in for Gemini, for load-testing the scheduler and the API
+    without a key. Answers after `latency` seconds (plus up to `jitter`), fails
+    a `rate_limit_rate` fraction of calls with a 429, and returns well-formed
+    analyses of the clauses found in the prompt.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_limit_rate: float = 0.0,
+                 seed: Optional[int] = None, stream_chunk_chars: int = 200):
+        self.latency = latency
+        self.stream_chunk_chars = stream_chunk_chars
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def warm(self) -> None:
+        """Nothing to connect to"""
+
+    def _next_call(self) -> float:
+        """Count the call, maybe fail it with a 429, and return its simulated latency"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if self._random.random() < self.rate_limit_rate:
+                self.rate_limited += 1
+                raise RateLimitError("429 Resource has been exhausted (fake backend)")
+        return delay
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self._next_call())
+        text = self.respond(prompt)
+        record_token_usage(prompt, text)
+        return text
+
+    async def generate_async(self, prompt: str) -> str:
+        await asyncio.sleep(self._next_call())
+        text = self.respond(prompt)
+        record_token_usage(prompt, text)
+        return text
+
+    async def generate_stream_async(self, prompt: str) -> AsyncIterator[str]:
+        """Stream the answer in pieces, spreading the latency over them"""
+        delay = self._next_call()
+        text = self.respond(prompt)
+        starts = range(0, len(text), self.stream_chunk_chars)
+        for start in starts:
+            await asyncio.sleep(delay / len(starts))
+            yield text[start:start + self.stream_chunk_chars]
+        record_token_usage(prompt, text)
+
+    def respond(self, prompt: str) -> str:
+        """Build a plausible JSON answer for a document, clause batch or single-clause prompt"""
+        batch = re.search(r"CLAUSES \(JSON\):\n(.*?)\n\s*Return ONLY", prompt, re.S)
+        if batch:
+            return json.dumps([
+                {"id": item["id"], **self._analysis(item["clause"])} for item in json.loads(batch.group(1))
+            ])
+        document = re.search(r"DOCUMENT TEXT:\n(.*)", prompt, re.S)
+        if document:
+            return json.dumps([self._analysis(clause) for clause in split_into_clauses(document.group(1))])
+        clause = re.search(r"CLAUSE: (.*?)\n\s*CONTEXT:", prompt, re.S)
+        return json.dumps(self._analysis(clause.group(1).strip() if clause else prompt[:200]))
+
+    def _analysis(self, clause: str) -> Dict[str, Any]:
+        risky = re.search(r"\b(liab|indemn|terminat|penalt)", clause, re.I)
+        return {
+            "clause": clause,
+            "risk": "High" if risky else "Low",
+            "laws": "General contract law principles",
+            "summary": "Simulated analysis from the fake Gemini backend.",
+        }
+
+class GeminiScheduler:
+    def __init__(self, backend, requests_per_minute: int = 60, tokens_per_minute: int = 1000000,
+                 max_retries: int = 4, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 call_timeout: float = 60.0, deadline: float = 180.0):
+        """
+        Initialize the scheduler
+
+        Args:
+            backend: Object with generate(prompt) and async generate_async(prompt) returning text,
+                and generate_stream_async(prompt) yielding it in pieces
+            requests_per_minute: Request quota (RPM)
+            tokens_per_minute: Input token quota (TPM), estimated from prompt length
+            max_retries: Retries after the first attempt for 429s, 5xx and timeouts
+            backoff_base: First backoff ceiling in seconds, doubled on every retry
+            backoff_max: Upper bound for a single backoff
+            call_timeout: Seconds a single attempt may take
+            deadline: Seconds a call may take overall, including throttling and retries
+        """
+        self.backend = backend
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.call_timeout = call_timeout
+        self.deadline = deadline
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}  # sync callers
+        self._inflight_async: Dict[Any, List] = {}  # (loop, key) -> [task, waiters]
+        self._executor = None  # runs sync attempts so they can be timed out
+
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+    def generate(self, prompt: str) -> str:
+        """Blocking call; identical prompts already in flight share its result"""
+        key = make_cache_key(prompt)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+                GEMINI_CALLS.inc(outcome="coalesced")
+
+        if leader:
+            try:
+                future.set_result(self._call(prompt))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return future.result()
+
+    async def generate_async(self, prompt: str) -> str:
+        """
+        Async call; identical prompts already in flight share its result.
+        The shared call is cancelled only once every caller waiting on it is gone.
+        """
+        key = (asyncio.get_running_loop(), make_cache_key(prompt))
+        entry = self._inflight_async.get(key)
+        # A finished or cancelled call can't be joined; its entry goes once the
+        # done callback runs, which may be after this caller arrives
+        if entry is None or entry[0].done():
+            task = asyncio.ensure_future(self._call_async(prompt))
+            entry = self._inflight_async[key] = [task, 0]
+            task.add_done_callback(lambda _, entry=entry: self._forget_inflight(key, entry))
+        else:
+            self.coalesced += 1
+            GEMINI_CALLS.inc(outcome="coalesced")
+
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+                self._forget_inflight(key, entry)  # the next caller starts a fresh call
+
+    def _forget_inflight(self, key: Any, entry: List) -> None:
+        """Drop an in-flight entry, unless a newer call has replaced it"""
+        if self._inflight_async.get(key) is entry:
+            del self._inflight_async[key]
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream the response text. Quota, retries and the per-attempt timeout
+        apply until the first piece arrives; a stream that breaks off later is
+        not retried, since its start has already been consumed. The deadline
+        bounds the whole stream. Streams are never coalesced.
+        """
+        deadline = time.monotonic() + self.deadline
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(tokens))
+            stream = self.backend.generate_stream_async(prompt)
+            try:
+                with span("gemini_first_token"):
+                    text = await asyncio.wait_for(stream.__anext__(), self._attempt_timeout(deadline))
+                self.calls += 1
+                GEMINI_CALLS.inc(outcome="ok")
+                break
+            except StopAsyncIteration:
+                self.calls += 1
+                GEMINI_CALLS.inc(outcome="ok")
+                return
+            except Exception as e:
+                await stream.aclose()
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        start = time.perf_counter()
+        try:
+            while True:
+                yield text
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(f"Gemini stream exceeded its {self.deadline:.0f}s deadline")
+                    text = await asyncio.wait_for(stream.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+        finally:
+            record_stage("gemini_stream", time.perf_counter() - start)
+            await stream.aclose()
+
+    def _call(self, prompt: str) -> str:
+        deadline = time.monotonic() + self.deadline
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            time.sleep(self._reserve(tokens))
+            try:
+                with span("gemini"):
+                    text = self._with_timeout(prompt, self._attempt_timeout(deadline))
+                self.calls += 1
+                GEMINI_CALLS.inc(outcome="ok")
+                return text
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def _call_async(self, prompt: str) -> str:
+        deadline = time.monotonic() + self.deadline
+        tokens = estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._reserve(tokens))
+            try:
+                with span("gemini"):
+                    text = await asyncio.wait_for(self.backend.generate_async(prompt), self._attempt_timeout(deadline))
+                self.calls += 1
+                GEMINI_CALLS.inc(outcome="ok")
+                return text
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _with_timeout(self, prompt: str, timeout: float) -> str:
+        """Run a blocking attempt in a helper thread so it can be abandoned on timeout"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(thread_name_prefix="gemini-call")
+        try:
+            return self._executor.submit(self.backend.generate, prompt).result(timeout=timeout)
+        except FutureTimeoutError:
+            raise asyncio.TimeoutError(f"Gemini call exceeded {timeout:.1f}s")
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserve quota for one request and return how long to wait for it"""
+        wait = max(self._requests.reserve(1), self._tokens.reserve(tokens))
+        self.throttled_seconds += wait
+        if wait:
+            record_stage("gemini_throttle", wait)
+        return wait
+
+    def _attempt_timeout(self, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError(f"Gemini call exceeded its {self.deadline:.0f}s deadline")
+        return min(self.call_timeout, remaining)
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """
+        Backoff before the next attempt (full jitter), or None if the error is
+        not retryable, retries are used up or the deadline would be passed
+        """
+        timed_out = isinstance(error, asyncio.TimeoutError)
+        status = getattr(error, "code", None)
+        if timed_out:
+            self.timeouts += 1
+            GEMINI_CALLS.inc(outcome="timeout")
+        elif status == 429:
+            self.rate_limited += 1
+            GEMINI_CALLS.inc(outcome="rate_limited")
+        else:
+            GEMINI_CALLS.inc(outcome="error")
+
+        if timed_out or status in RETRYABLE_STATUS:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if attempt < self.max_retries and time.monotonic() + delay < deadline:
+                self.retries += 1
+                record_stage("gemini_backoff", delay)
+                logger.warning(f"Gemini call failed ({error}), retry {attempt + 1} in {delay:.1f}s")
+                return delay
+
+        self.failures += 1
+        return None
+
+    def close(self) -> None:
+        """Stop the helper threads of blocking attempts; a later call starts new ones"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Call, retry and throttling counters for health reporting"""
+        return {
+            "backend": self.backend.name,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "throttled_seconds": round(self.throttled_seconds, 2),
+        }
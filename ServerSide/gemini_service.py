@@ -4,36 +4,150 @@ Provides detailed clause analysis, risk assessment, and legal summaries
 """
 
 import google.generativeai as genai
+import asyncio
 import json
 import re
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple
 import logging
 from datetime import datetime
 
+from clause_triage import FOCUS_AREAS, triage_clauses
+from document_chunker import chunk_text, estimate_tokens, split_into_clauses
+from gemini_scheduler import GeminiBackend, GeminiScheduler
+from json_stream import JSONArrayStreamParser, complete_objects
+from metrics import ERROR_RESPONSES, PARSE_OUTCOMES, span
+from result_cache import ResultCache, make_cache_key
+from text_extractor import normalize_text
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bump whenever the analysis prompt or parsing changes, so cached results are invalidated
+PROMPT_VERSION = "5"
+
+# Clause segments shorter than this (headings, numbering) are never looked up in the clause cache
+MIN_CACHEABLE_CLAUSE_CHARS = 40
+
+# Share of a returned clause's words that must occur in a segment to attribute it to that segment
+MIN_SEGMENT_OVERLAP = 0.6
+
+# Used to keep the most severe assessment when chunks report the same clause
+RISK_RANK = {"Low": 0, "Medium": 1, "High": 2}
+
+# Static part of the document analysis prompt, built once and sent as the
+# identical prefix of every call (the document follows it)
+ANALYSIS_INSTRUCTIONS = """
+You are an expert legal analyst specializing in contract review and risk assessment. 
+Analyze the document given after these instructions and provide detailed analysis for each important clause.
+
+ANALYSIS REQUIREMENTS:
+1. Identify ALL important clauses in the document
+2. For each clause, provide risk assessment (High/Medium/Low)
+3. Explain the legal implications and original law basis
+4. Provide detailed summary with potential impact
+
+OUTPUT FORMAT (JSON):
+Return a JSON array where each object represents a clause analysis:
+
+[
+  {
+    "clause": "Full text of the identified clause",
+    "risk": "High|Medium|Low",
+    "laws": "Relevant legal principles, statutes, or common law that applies to this clause",
+    "summary": "Detailed analysis explaining: 1) What this clause means in plain language, 2) Potential risks or benefits, 3) Impact on parties involved, 4) Recommendations"
+  }
+]
+
+FOCUS AREAS:
+""" + "\n".join(f"- {area}" for area in FOCUS_AREAS) + """
+
+RISK ASSESSMENT CRITERIA:
+- High Risk: Could result in significant financial loss, legal liability, or operational disruption
+- Medium Risk: Moderate impact on business operations or legal exposure
+- Low Risk: Minor implications with limited impact
+
+Provide comprehensive, accurate, and actionable legal analysis. Focus on practical implications for business decisions.
+
+IMPORTANT: Return ONLY the JSON array, no additional text or formatting.
+"""
+
+def supports_json_mode() -> bool:
+    """Gemini's JSON response mode (response_mime_type) needs google-generativeai >= 0.5"""
+    return "response_mime_type" in getattr(genai.types.GenerationConfig, "__dataclass_fields__", {})
+
+# Estimated prompt tokens per clause in a batch beyond the clause text itself (id, JSON quoting)
+CLAUSE_BATCH_OVERHEAD_TOKENS = 10
+
+def match_segment(clause: str, segments: List[str]) -> Optional[int]:
+    """
+    Index of the segment a returned clause analysis came from, or None.
+    The model's "clause" is usually a trimmed excerpt or a paraphrase of the
+    segment, so it is matched on word overlap rather than exact text.
+    """
+    text = normalize_text(clause)
+    words = set(text.split())
+    if not words:
+        return None
+    best, best_score = None, 0.0
+    for index, segment in enumerate(segments):
+        segment_text = normalize_text(segment)
+        score = 1.0 if text in segment_text else len(words & set(segment_text.split())) / len(words)
+        if score >= MIN_SEGMENT_OVERLAP and score > best_score:
+            best, best_score = index, score
+    return best
+
 class GeminiLegalAnalyzer:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, chunk_max_tokens: int = 6000, max_parallel_chunks: int = 4,
+                 clause_cache: Optional[ResultCache] = None, scheduler: Optional[GeminiScheduler] = None,
+                 clause_batch_max_tokens: int = 4000, clause_batch_max_items: int = 20,
+                 json_mode: bool = True, triage: bool = True):
         """
         Initialize Gemini AI service for legal analysis
         
         Args:
             api_key: Google Gemini API key
+            chunk_max_tokens: Token budget for each chunk of a long document
+            max_parallel_chunks: How many chunks of one document are analyzed at once
+            clause_cache: Optional cache of per-clause results keyed on normalized clause text and context
+            scheduler: Rate-limiting/retrying scheduler for model calls
+                (defaults to one with default quotas in front of this analyzer's model)
+            clause_batch_max_tokens: Token budget for the clauses packed into one batch call
+            clause_batch_max_items: Most clauses per batch call, bounding the response size
+            json_mode: Ask Gemini for application/json responses where the SDK supports it
+            triage: Send only clauses matching a focus area to Gemini; recitals, signature
+                blocks, definitions and untagged clauses get a local summary instead
         """
         self.api_key = api_key
+        self.chunk_max_tokens = chunk_max_tokens
+        self.max_parallel_chunks = max_parallel_chunks
+        self.clause_cache = clause_cache
+        self.clause_batch_max_tokens = clause_batch_max_tokens
+        self.clause_batch_max_items = clause_batch_max_items
+        self.clause_tokens_saved = 0  # estimated prompt tokens not sent thanks to clause cache hits
+        self.triage = triage
+        self.triage_clauses_skipped = 0
+        self.triage_tokens_skipped = 0  # estimated prompt tokens not sent thanks to triage
         genai.configure(api_key=api_key)
         
         # Configure the model for legal analysis
+        self.model_name = "gemini-1.5-flash"  # Using latest Gemini model
+        generation_config = {
+            "temperature": 0.1,  # Low temperature for factual legal analysis
+            "top_p": 0.8,
+            "top_k": 40,
+            "max_output_tokens": 8192,  # Increased for detailed analysis
+        }
+        self.json_mode = json_mode and supports_json_mode()
+        if self.json_mode:
+            # Every prompt asks for JSON; the model then never wraps it in markdown or prose
+            generation_config["response_mime_type"] = "application/json"
+        elif json_mode:
+            logger.warning("google-generativeai < 0.5 has no JSON response mode, parsing free-form responses")
         self.model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",  # Using latest Gemini model
-            generation_config={
-                "temperature": 0.1,  # Low temperature for factual legal analysis
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 8192,  # Increased for detailed analysis
-            },
+            model_name=self.model_name,
+            generation_config=generation_config,
             safety_settings=[
                 {
                     "category": "HARM_CATEGORY_HARASSMENT",
@@ -53,10 +167,38 @@ class GeminiLegalAnalyzer:
                 }
             ]
         )
+        self.scheduler = scheduler or GeminiScheduler(GeminiBackend(self.model))
     
     def analyze_legal_document(self, document_text: str, document_type: str = "contract") -> List[Dict[str, Any]]:
         """
-        Analyze legal document and extract clauses with risk assessment
+        Analyze legal document and extract clauses with risk assessment.
+        Long documents are split on clause boundaries and the chunks are
+        analyzed in parallel, then merged.
+        
+        Args:
+            document_text: Full text of the legal document
+            document_type: Type of document (contract, agreement, policy, etc.)
+            
+        Returns:
+            List of analyzed clauses with risk assessment
+        """
+        with span("analysis"):
+            chunks, local, positions = self._plan_document(document_text)
+            if len(chunks) > 1:
+                with ThreadPoolExecutor(max_workers=self.max_parallel_chunks) as executor:
+                    chunk_results = list(executor.map(
+                        lambda indexed: self._analyze_chunk(indexed[1], document_type, (indexed[0] + 1, len(chunks))),
+                        enumerate(chunks)
+                    ))
+            else:
+                chunk_results = [self._analyze_chunk(chunk, document_type) for chunk in chunks]
+            
+            return self._merge_clause_analyses(chunks, chunk_results, local, positions)
+    
+    async def analyze_legal_document_async(self, document_text: str, document_type: str = "contract") -> List[Dict[str, Any]]:
+        """
+        Async variant of analyze_legal_document using Gemini's async client,
+        so the call doesn't block the event loop while waiting on the model
         
         Args:
             document_text: Full text of the legal document
@@ -65,75 +207,299 @@ class GeminiLegalAnalyzer:
         Returns:
             List of analyzed clauses with risk assessment
         """
+        with span("analysis"):
+            chunks, local, positions = self._plan_document(document_text)
+            semaphore = asyncio.Semaphore(self.max_parallel_chunks)
+            
+            async def analyze(index: int, chunk: str) -> List[Dict[str, Any]]:
+                part = (index + 1, len(chunks)) if len(chunks) > 1 else None
+                async with semaphore:
+                    return await self._analyze_chunk_async(chunk, document_type, part)
+            
+            chunk_results = await asyncio.gather(*(
+                analyze(index, chunk) for index, chunk in enumerate(chunks)
+            ))
+            return self._merge_clause_analyses(chunks, list(chunk_results), local, positions)
+    
+    async def iter_document_analysis_async(self, document_text: str, document_type: str = "contract",
+                                           ordered: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield clause analyses as soon as they are available, instead of waiting
+        for the whole document. Responses are streamed and each clause is yielded
+        as soon as its JSON object is complete, before generation ends. Clauses
+        already yielded by another chunk are skipped.
+        
+        Args:
+            document_text: Full text of the legal document
+            document_type: Type of document (contract, agreement, policy, etc.)
+            ordered: If given, filled once every chunk has finished with the same
+                list analyze_legal_document_async returns - document order, each
+                clause once with its highest risk assessment
+            
+        Yields:
+            Analyzed clauses in completion order
+        """
+        chunks, local, positions = self._plan_document(document_text)
+        semaphore = asyncio.Semaphore(self.max_parallel_chunks)
+        ready = asyncio.Queue()  # clause analyses, plus None each time a chunk finishes
+        chunk_results = [[] for _ in chunks]
+        
+        async def analyze(index: int, chunk: str) -> None:
+            part = (index + 1, len(chunks)) if len(chunks) > 1 else None
+            
+            def emit(analysis: Dict[str, Any]) -> None:
+                chunk_results[index].append(analysis)
+                ready.put_nowait(analysis)
+            
+            async with semaphore:
+                await self._stream_chunk_async(chunk, document_type, part, emit)
+        
+        tasks = [asyncio.ensure_future(analyze(index, chunk)) for index, chunk in enumerate(chunks)]
+        for task in tasks:
+            task.add_done_callback(lambda _: ready.put_nowait(None))
+        for _, analysis in local:
+            ready.put_nowait(analysis)  # locally triaged clauses are ready right away
+        seen = set()
+        finished = 0
+        with span("analysis"):
+            try:
+                while finished < len(tasks) or not ready.empty():
+                    analysis = await ready.get()
+                    if analysis is None:
+                        finished += 1
+                        continue
+                    key = normalize_text(analysis.get("clause", ""))
+                    if key not in seen:
+                        seen.add(key)
+                        yield analysis
+                if ordered is not None:
+                    ordered.extend(self._merge_clause_analyses(chunks, chunk_results, local, positions))
+            finally:
+                # Consumer stopped early (e.g. client disconnected) - drop the remaining calls
+                for task in tasks:
+                    task.cancel()
+    
+    def _analyze_chunk(self, chunk: str, document_type: str, part: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """Run one analysis call for a chunk of the document, skipping clauses already cached"""
+        cached, remaining = self._split_cached_clauses(chunk, document_type)
+        if not remaining:
+            return cached
+        
         try:
             # Create comprehensive legal analysis prompt
-            prompt = self._create_analysis_prompt(document_text, document_type)
+            prompt = self._create_analysis_prompt("\n\n".join(remaining), document_type, part)
             
-            # Generate analysis using Gemini
-            response = self.model.generate_content(prompt)
+            # Generate analysis using Gemini (throttled and retried by the scheduler)
+            response_text = self.scheduler.generate(prompt)
             
             # Parse and structure the response
-            analysis_result = self._parse_gemini_response(response.text)
+            analysis_result = self._parse_gemini_response(response_text)
+            self._store_clause_results(analysis_result, remaining, document_type)
+            return cached + analysis_result
             
-            return analysis_result
+        except Exception as e:
+            logger.error(f"Error in legal document analysis: {str(e)}")
+            return cached + self._create_error_response(str(e))
+    
+    async def _analyze_chunk_async(self, chunk: str, document_type: str, part: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        """Run one async analysis call for a chunk of the document, skipping clauses already cached"""
+        cached, remaining = self._split_cached_clauses(chunk, document_type)
+        if not remaining:
+            return cached
+        
+        try:
+            prompt = self._create_analysis_prompt("\n\n".join(remaining), document_type, part)
+            response_text = await self.scheduler.generate_async(prompt)
+            analysis_result = self._parse_gemini_response(response_text)
+            self._store_clause_results(analysis_result, remaining, document_type)
+            return cached + analysis_result
             
         except Exception as e:
             logger.error(f"Error in legal document analysis: {str(e)}")
-            return self._create_error_response(str(e))
+            return cached + self._create_error_response(str(e))
+    
+    def _plan_document(self, document_text: str) -> Tuple[List[str], List[Tuple[int, Dict[str, Any]]], Dict[str, int]]:
+        """
+        Triage the document (when enabled) and chunk the part that goes to Gemini.
+        Returns the chunks, possibly none, the local analyses of skipped clauses
+        with their segment index, and the segment index of each clause sent to
+        Gemini keyed on its normalized text.
+        """
+        local = []
+        if self.triage:
+            with span("triage"):
+                candidates, local = triage_clauses(document_text)
+            self.triage_clauses_skipped += len(local)
+            self.triage_tokens_skipped += sum(estimate_tokens(analysis["clause"]) for _, analysis in local)
+            if not candidates and local:
+                return [], local, {}
+        if not self.triage or not candidates:
+            candidates = list(enumerate(split_into_clauses(document_text)))
+        else:
+            document_text = "\n\n".join(clause for _, clause in candidates)
+        positions = {normalize_text(clause): position for position, clause in reversed(candidates)}
+        with span("chunking"):
+            chunks = chunk_text(document_text, self.chunk_max_tokens) or [document_text]
+        return chunks, local, positions
     
-    def _create_analysis_prompt(self, document_text: str, document_type: str) -> str:
-        """Create a comprehensive prompt for legal analysis"""
+    def triage_stats(self) -> Dict[str, Any]:
+        """Clauses and estimated prompt tokens kept away from Gemini by triage"""
+        return {
+            "enabled": self.triage,
+            "clauses_skipped": self.triage_clauses_skipped,
+            "tokens_skipped": self.triage_tokens_skipped,
+        }
+    
+    async def _stream_chunk_async(self, chunk: str, document_type: str, part: Optional[Tuple[int, int]],
+                                  emit: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        Stream one chunk's analysis, passing each clause to emit as soon as its
+        JSON object is complete. If the stream breaks off, the clauses already
+        received are kept; if none could be parsed, the whole text falls back
+        to _parse_gemini_response.
+        """
+        cached, remaining = self._split_cached_clauses(chunk, document_type)
+        for analysis in cached:
+            emit(analysis)
+        if not remaining:
+            return
         
-        prompt = f"""
-You are an expert legal analyst specializing in contract review and risk assessment. 
-Analyze the following {document_type} and provide detailed analysis for each important clause.
-
+        parser = JSONArrayStreamParser()
+        received = []
+        emitted = []
+        try:
+            prompt = self._create_analysis_prompt("\n\n".join(remaining), document_type, part)
+            async for text in self.scheduler.stream_async(prompt):
+                received.append(text)
+                for item in parser.feed(text):
+                    analysis = self._structure_clause(item)
+                    emit(analysis)
+                    emitted.append(analysis)
+        except Exception as e:
+            logger.error(f"Error in streamed legal document analysis: {str(e)}")
+            if emitted:
+                PARSE_OUTCOMES.inc(outcome="salvaged")
+                self._store_clause_results(emitted, remaining, document_type)
+            else:
+                for analysis in self._create_error_response(str(e)):
+                    emit(analysis)
+            return
+        
+        if emitted:
+            PARSE_OUTCOMES.inc(outcome="json")
+            self._store_clause_results(emitted, remaining, document_type)
+        else:
+            for analysis in self._parse_gemini_response("".join(received)):
+                emit(analysis)
+    
+    def _clause_cache_key(self, clause_text: str, context: str = "", scope: str = "clause") -> str:
+        """
+        Cache key for a clause: its normalized text, the context it was analyzed
+        in, and model and prompt version. Document segments (scope "document",
+        cached as lists of analyses) never share keys with single clauses.
+        """
+        return make_cache_key(normalize_text(clause_text), context, scope, self.model_name, PROMPT_VERSION)
+    
+    def _split_cached_clauses(self, chunk: str, document_type: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Look up each clause segment of a chunk in the clause cache.
+        Returns the cached analyses and the segments still to be analyzed.
+        """
+        segments = split_into_clauses(chunk) or [chunk]
+        if not self.clause_cache:
+            return [], segments
+        
+        cached = []
+        remaining = []
+        for segment in segments:
+            analyses = None
+            if len(segment) >= MIN_CACHEABLE_CLAUSE_CHARS:
+                analyses = self.clause_cache.get(self._clause_cache_key(segment, document_type, "document"))
+            if analyses is None:
+                remaining.append(segment)
+            else:
+                cached.extend(analyses)
+                self.clause_tokens_saved += estimate_tokens(segment)
+        
+        return cached, remaining
+    
+    def _store_clause_results(self, analyses: List[Dict[str, Any]], segments: List[str], document_type: str) -> None:
+        """
+        Cache parsed clause analyses under the segment each one came from, so the
+        next lookup of that segment hits even though the model's "clause" text
+        is an excerpt or paraphrase. A segment is only cached if every analysis
+        attributed to it parsed cleanly.
+        """
+        if not self.clause_cache:
+            return
+        by_segment = {}
+        for analysis in analyses:
+            index = match_segment(analysis.get("clause", ""), segments)
+            if index is not None:
+                by_segment.setdefault(index, []).append(analysis)
+        for index, segment_analyses in by_segment.items():
+            segment = segments[index]
+            clean = all(a.get("confidence") == "high" and not a.get("error") for a in segment_analyses)
+            if clean and len(segment) >= MIN_CACHEABLE_CLAUSE_CHARS:
+                self.clause_cache.set(self._clause_cache_key(segment, document_type, "document"), segment_analyses)
+    
+    def clause_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Clause cache hit ratio and estimated prompt tokens saved"""
+        if not self.clause_cache:
+            return None
+        return {**self.clause_cache.stats(), "tokens_saved": self.clause_tokens_saved}
+    
+    def _merge_clause_analyses(self, chunks: List[str], chunk_results: List[List[Dict[str, Any]]],
+                               local: List[Tuple[int, Dict[str, Any]]], positions: Dict[str, int]) -> List[Dict[str, Any]]:
+        """
+        Merge per-chunk clause lists and local analyses in document order,
+        dropping clauses reported more than once and keeping the highest risk
+        assessment. Each model analysis takes the segment index of the chunk
+        segment it came from; one that matches none keeps its place after the
+        analysis before it.
+        """
+        placed = []
+        position = -1
+        for chunk, clause_analyses in zip(chunks, chunk_results):
+            segments = split_into_clauses(chunk)
+            for analysis in clause_analyses:
+                index = match_segment(analysis.get("clause", ""), segments)
+                if index is not None:
+                    position = positions.get(normalize_text(segments[index]), position)
+                placed.append((position, analysis))
+        placed.extend(local)
+        
+        merged = {}  # a replaced entry keeps its first occurrence's place
+        for _, analysis in sorted(placed, key=lambda item: item[0]):
+            key = normalize_text(analysis.get("clause", ""))
+            existing = merged.get(key)
+            if existing is None or RISK_RANK.get(analysis.get("risk"), 1) > RISK_RANK.get(existing.get("risk"), 1):
+                merged[key] = analysis
+        return list(merged.values())
+    
+    def _create_analysis_prompt(self, document_text: str, document_type: str, part: Optional[Tuple[int, int]] = None) -> str:
+        """
+        Create a comprehensive prompt for legal analysis: the static instruction
+        block first, so every call shares an identical prefix, then the document
+        """
+        with span("prompt"):
+            part_note = ""
+            if part:
+                part_note = f"This is part {part[0]} of {part[1]} of the document. Analyze only the clauses in this part.\n"
+            
+            return f"""{ANALYSIS_INSTRUCTIONS}
+DOCUMENT TYPE: {document_type}
+{part_note}
 DOCUMENT TEXT:
 {document_text}
-
-ANALYSIS REQUIREMENTS:
-1. Identify ALL important clauses in the document
-2. For each clause, provide risk assessment (High/Medium/Low)
-3. Explain the legal implications and original law basis
-4. Provide detailed summary with potential impact
-
-OUTPUT FORMAT (JSON):
-Return a JSON array where each object represents a clause analysis:
-
-[
-  {{
-    "clause": "Full text of the identified clause",
-    "risk": "High|Medium|Low",
-    "laws": "Relevant legal principles, statutes, or common law that applies to this clause",
-    "summary": "Detailed analysis explaining: 1) What this clause means in plain language, 2) Potential risks or benefits, 3) Impact on parties involved, 4) Recommendations"
-  }}
-]
-
-FOCUS AREAS:
-- Payment terms and penalties
-- Liability and indemnification clauses
-- Termination conditions
-- Intellectual property rights
-- Confidentiality agreements
-- Force majeure provisions
-- Dispute resolution mechanisms
-- Warranties and representations
-- Limitation of liability
-- Governing law and jurisdiction
-
-RISK ASSESSMENT CRITERIA:
-- High Risk: Could result in significant financial loss, legal liability, or operational disruption
-- Medium Risk: Moderate impact on business operations or legal exposure
-- Low Risk: Minor implications with limited impact
-
-Provide comprehensive, accurate, and actionable legal analysis. Focus on practical implications for business decisions.
-
-IMPORTANT: Return ONLY the JSON array, no additional text or formatting.
 """
-        return prompt
     
     def _parse_gemini_response(self, response_text: str) -> List[Dict[str, Any]]:
         """Parse Gemini response and extract structured analysis"""
+        with span("parse"):
+            return self._parse_analysis_text(response_text)
+    
+    def _parse_analysis_text(self, response_text: str) -> List[Dict[str, Any]]:
         try:
             # Clean the response text
             cleaned_text = self._clean_response_text(response_text)
@@ -142,29 +508,35 @@ IMPORTANT: Return ONLY the JSON array, no additional text or formatting.
             analysis_data = json.loads(cleaned_text)
             
             # Validate and structure the response
-            structured_analysis = []
-            
-            for item in analysis_data:
-                if isinstance(item, dict):
-                    clause_analysis = {
-                        "clause": item.get("clause", ""),
-                        "risk": self._validate_risk_level(item.get("risk", "Medium")),
-                        "laws": item.get("laws", "General contract law principles"),
-                        "summary": item.get("summary", "Analysis not available"),
-                        "analyzed_at": datetime.now().isoformat(),
-                        "confidence": "high"  # Gemini typically provides high-confidence analysis
-                    }
-                    structured_analysis.append(clause_analysis)
-            
-            return structured_analysis
+            PARSE_OUTCOMES.inc(outcome="json")
+            return [self._structure_clause(item) for item in analysis_data if isinstance(item, dict)]
             
         except json.JSONDecodeError as e:
+            # Usually a response cut off at max_output_tokens - keep every complete clause object
+            salvaged = complete_objects(response_text)
+            if salvaged:
+                PARSE_OUTCOMES.inc(outcome="salvaged")
+                logger.warning(f"Truncated JSON response, kept {len(salvaged)} complete clauses")
+                return [self._structure_clause(item) for item in salvaged]
             logger.error(f"JSON parsing error: {str(e)}")
+            PARSE_OUTCOMES.inc(outcome="fallback")
             return self._fallback_text_parsing(response_text)
         except Exception as e:
             logger.error(f"Response parsing error: {str(e)}")
+            PARSE_OUTCOMES.inc(outcome="failed")
             return self._create_error_response(f"Parsing error: {str(e)}")
     
+    def _structure_clause(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate one clause object from a response into the analysis format"""
+        return {
+            "clause": item.get("clause", ""),
+            "risk": self._validate_risk_level(str(item.get("risk", "Medium"))),
+            "laws": item.get("laws", "General contract law principles"),
+            "summary": item.get("summary", "Analysis not available"),
+            "analyzed_at": datetime.now().isoformat(),
+            "confidence": "high"  # Gemini typically provides high-confidence analysis
+        }
+    
     def _clean_response_text(self, text: str) -> str:
         """Clean the response text for JSON parsing"""
         # Remove markdown code blocks
@@ -219,6 +591,7 @@ IMPORTANT: Return ONLY the JSON array, no additional text or formatting.
     
     def _create_error_response(self, error_message: str) -> List[Dict[str, Any]]:
         """Create error response in expected format"""
+        ERROR_RESPONSES.inc()
         return [{
             "clause": "Error in document analysis",
             "risk": "High",
@@ -258,12 +631,219 @@ Provide detailed analysis in this exact JSON format:
 Focus on practical implications and actionable insights.
 """
         
+        cache_key = self._clause_cache_key(clause_text, context)
+        if self.clause_cache:
+            cached = self.clause_cache.get(cache_key)
+            if cached is not None:
+                self.clause_tokens_saved += estimate_tokens(clause_text)
+                return cached
+        
         try:
-            response = self.model.generate_content(prompt)
-            return self._parse_single_clause_response(response.text)
+            response_text = self.scheduler.generate(prompt)
+            analysis = self._parse_single_clause_response(response_text)
+            if self.clause_cache and not analysis.get("error"):
+                self.clause_cache.set(cache_key, analysis)
+            return analysis
         except Exception as e:
             return self._create_error_response(str(e))[0]
     
+    def analyze_clauses(self, clause_texts: List[str], context: str = "") -> List[Dict[str, Any]]:
+        """
+        Analyze many clauses with as few model calls as possible.
+        Uncached clauses are packed into batches within the token budget; a batch
+        whose response is truncated or unparseable is split and retried.
+        
+        Args:
+            clause_texts: Clauses to analyze
+            context: Additional context about the document
+            
+        Returns:
+            One analysis per clause, in the order given
+        """
+        results, pending = self._lookup_clause_batch(clause_texts, context)
+        for batch in self._pack_clause_batches(pending):
+            results.update(self._analyze_clause_batch(batch, context))
+        return self._finish_clause_batch(clause_texts, results, context)
+    
+    async def analyze_clauses_async(self, clause_texts: List[str], context: str = "") -> List[Dict[str, Any]]:
+        """
+        Async variant of analyze_clauses; batches run in parallel, up to
+        max_parallel_chunks at a time
+        
+        Args:
+            clause_texts: Clauses to analyze
+            context: Additional context about the document
+            
+        Returns:
+            One analysis per clause, in the order given
+        """
+        results, pending = self._lookup_clause_batch(clause_texts, context)
+        semaphore = asyncio.Semaphore(self.max_parallel_chunks)
+        
+        async def analyze(batch: List[Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
+            async with semaphore:
+                return await self._analyze_clause_batch_async(batch, context)
+        
+        for batch_results in await asyncio.gather(*(analyze(batch) for batch in self._pack_clause_batches(pending))):
+            results.update(batch_results)
+        return self._finish_clause_batch(clause_texts, results, context)
+    
+    def _lookup_clause_batch(self, clause_texts: List[str], context: str) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, str]]]:
+        """
+        Resolve cached clauses. Returns results keyed by clause cache key and
+        the (key, clause) pairs still to be analyzed, each distinct clause once.
+        """
+        results = {}
+        pending = {}
+        for clause in clause_texts:
+            key = self._clause_cache_key(clause, context)
+            if key in results or key in pending:
+                continue
+            cached = self.clause_cache.get(key) if self.clause_cache else None
+            if cached is None:
+                pending[key] = clause
+            else:
+                results[key] = cached
+                self.clause_tokens_saved += estimate_tokens(clause)
+        return results, list(pending.items())
+    
+    def _pack_clause_batches(self, pending: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        """Pack clauses in order into batches within the token and item limits"""
+        batches = []
+        current = []
+        current_tokens = 0
+        for item in pending:
+            tokens = estimate_tokens(item[1]) + CLAUSE_BATCH_OVERHEAD_TOKENS
+            if current and (current_tokens + tokens > self.clause_batch_max_tokens
+                            or len(current) >= self.clause_batch_max_items):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(item)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _finish_clause_batch(self, clause_texts: List[str], results: Dict[str, Dict[str, Any]], context: str) -> List[Dict[str, Any]]:
+        """Cache new results and return them in the order the clauses were given"""
+        if self.clause_cache:
+            for key, analysis in results.items():
+                if not analysis.get("error"):
+                    self.clause_cache.set(key, analysis)
+        return [results[self._clause_cache_key(clause, context)] for clause in clause_texts]
+    
+    def _analyze_clause_batch(self, batch: List[Tuple[str, str]], context: str) -> Dict[str, Dict[str, Any]]:
+        """One batch call; clauses missing from the response are retried in smaller batches"""
+        try:
+            response_text = self.scheduler.generate(self._create_clause_batch_prompt(batch, context))
+        except Exception as e:
+            logger.error(f"Error in batch clause analysis: {str(e)}")
+            return self._clause_batch_errors(batch, str(e))
+        
+        results = self._parse_clause_batch_response(response_text, batch)
+        for retry in self._split_clause_batch(batch, results):
+            results.update(self._analyze_clause_batch(retry, context))
+        return results
+    
+    async def _analyze_clause_batch_async(self, batch: List[Tuple[str, str]], context: str) -> Dict[str, Dict[str, Any]]:
+        """Async variant of _analyze_clause_batch, running the retries in parallel"""
+        try:
+            response_text = await self.scheduler.generate_async(self._create_clause_batch_prompt(batch, context))
+        except Exception as e:
+            logger.error(f"Error in batch clause analysis: {str(e)}")
+            return self._clause_batch_errors(batch, str(e))
+        
+        results = self._parse_clause_batch_response(response_text, batch)
+        for retry_results in await asyncio.gather(*(
+            self._analyze_clause_batch_async(retry, context) for retry in self._split_clause_batch(batch, results)
+        )):
+            results.update(retry_results)
+        return results
+    
+    def _split_clause_batch(self, batch: List[Tuple[str, str]], results: Dict[str, Dict[str, Any]]) -> List[List[Tuple[str, str]]]:
+        """
+        Decide how to retry the clauses a response did not cover. A truncated
+        response covers a prefix, so the rest is retried as one batch; a response
+        covering nothing is split in half. A single clause that still fails gets
+        an error result instead of another call.
+        """
+        missing = [item for item in batch if item[0] not in results]
+        if not missing:
+            return []
+        if len(batch) == 1:
+            results.update(self._clause_batch_errors(missing, "Response could not be parsed"))
+            return []
+        if len(missing) < len(batch):
+            return [missing]
+        logger.warning(f"Unparseable batch response for {len(batch)} clauses, splitting")
+        half = len(batch) // 2
+        return [batch[:half], batch[half:]]
+    
+    def _clause_batch_errors(self, batch: List[Tuple[str, str]], error_message: str) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        for key, clause in batch:
+            results[key] = {**self._create_error_response(error_message)[0], "clause": clause}
+        return results
+    
+    def _create_clause_batch_prompt(self, batch: List[Tuple[str, str]], context: str) -> str:
+        """Prompt analyzing several clauses at once, each identified by a short id"""
+        with span("prompt"):
+            clauses = json.dumps(
+                [{"id": str(index + 1), "clause": clause} for index, (_, clause) in enumerate(batch)],
+                ensure_ascii=False, indent=1
+            )
+        return f"""
+Analyze each of these legal clauses in detail.
+
+CONTEXT: {context}
+
+CLAUSES (JSON):
+{clauses}
+
+Return ONLY a JSON array with exactly one object per clause, in the same order, in this format:
+[
+  {{
+    "id": "The id of the clause",
+    "risk": "High|Medium|Low",
+    "laws": "Specific laws, regulations, or legal principles that apply",
+    "summary": "Comprehensive analysis including interpretation, risks, benefits, and recommendations"
+  }}
+]
+
+Do not repeat the clause text. Focus on practical implications and actionable insights.
+"""
+    
+    def _parse_clause_batch_response(self, response_text: str, batch: List[Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
+        """Map the objects of a batch response back to their clauses by id"""
+        try:
+            with span("parse"):
+                items = json.loads(self._clean_response_text(response_text))
+            PARSE_OUTCOMES.inc(outcome="json")
+        except (json.JSONDecodeError, ValueError) as e:
+            # Keep the complete objects of a truncated response; only the rest is retried
+            items = complete_objects(response_text)
+            PARSE_OUTCOMES.inc(outcome="salvaged" if items else "failed")
+            logger.warning(f"Batch response parsing error ({str(e)}), kept {len(items)} complete objects")
+        
+        results = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index = str(item.get("id", "")).strip()
+            if not index.isdigit() or not 1 <= int(index) <= len(batch):
+                continue
+            key, clause = batch[int(index) - 1]
+            results[key] = {
+                "clause": clause,
+                "risk": self._validate_risk_level(str(item.get("risk", "Medium"))),
+                "laws": item.get("laws", "General legal principles"),
+                "summary": item.get("summary", "Analysis not available"),
+                "analyzed_at": datetime.now().isoformat(),
+                "confidence": "high"
+            }
+        return results
+    
     def _parse_single_clause_response(self, response_text: str) -> Dict[str, Any]:
         """Parse response for single clause analysis"""
         try:
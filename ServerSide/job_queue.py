@@ -0,0 +1,380 @@
+"""
+Background job subsystem for long-running document analysis
+Bounded worker scheduler with timeouts, cancellation and queue backpressure,
+plus pluggable job stores (in-memory or SQLite)
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED, TIMED_OUT)
+
+# How often a running job checks whether another worker cancelled it in a shared store
+CANCEL_POLL_SECONDS = 2.0
+
+# How often a worker refreshes its heartbeat in a shared store
+HEARTBEAT_SECONDS = 10.0
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+def new_job_record(files: List[str]) -> Dict[str, Any]:
+    """Create the initial record for a queued job"""
+    return {
+        "job_id": uuid.uuid4().hex,
+        "status": QUEUED,
+        "files": files,
+        "files_done": 0,
+        "legal_analysis": [],
+        "result": None,
+        "error": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+
+class InMemoryJobStore:
+    """Job records kept in process memory - lost on restart, not shared between workers"""
+
+    def __init__(self, retention_seconds: int = 3600):
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._prune()
+            self._jobs[job["job_id"]] = job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def update_if(self, job_id: str, statuses: Iterable[str], **fields) -> bool:
+        """Apply fields only if the job is still in one of statuses; returns whether it was"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job["status"] not in statuses:
+                return False
+            job.update(fields)
+            return True
+
+    def append_clauses(self, job_id: str, legal_items: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id]["legal_analysis"].extend(legal_items)
+
+    def heartbeat(self) -> None:
+        """Nothing to do - no other process can see these jobs"""
+
+    def close(self) -> None:
+        pass
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in FINISHED_STATES and (job["finished_at"] or 0) < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+class SQLiteJobStore:
+    """
+    Job records kept in a SQLite file, so they survive restarts of a local run
+    and are shared by the worker processes of one host. Every read-modify-write
+    runs in an immediate transaction, so workers never overwrite each other's changes.
+
+    Each store instance (one per worker) has a random owner token and keeps a
+    heartbeat row fresh while it runs. Jobs whose owner has gone silent for
+    heartbeat_timeout seconds are failed - a pid can't tell, since pids are
+    reused and mean nothing across hosts sharing the file.
+    """
+
+    def __init__(self, db_path: str, retention_seconds: int = 3600, heartbeat_timeout: int = 60):
+        self.retention_seconds = retention_seconds
+        self.heartbeat_timeout = heartbeat_timeout
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+            "data TEXT NOT NULL, finished_at REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS workers (owner TEXT PRIMARY KEY, heartbeat_at REAL NOT NULL)")
+        self._db.commit()
+        self.heartbeat()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.rollback()
+                raise
+            self._db.commit()
+
+    def heartbeat(self) -> None:
+        """Mark this worker alive, then fail the jobs of workers that no longer are"""
+        with self._transaction():
+            self._db.execute(
+                "INSERT OR REPLACE INTO workers (owner, heartbeat_at) VALUES (?, ?)",
+                (self.owner, time.time())
+            )
+        self.recover_interrupted()
+
+    def recover_interrupted(self) -> None:
+        """
+        Fail unfinished jobs whose worker has stopped sending heartbeats (or
+        shut down) - their uploaded files did not survive it. Jobs of the
+        other live workers are left alone.
+        """
+        now = time.time()
+        with self._transaction():
+            heartbeats = dict(self._db.execute("SELECT owner, heartbeat_at FROM workers").fetchall())
+            for job_id, data in self._db.execute(
+                "SELECT job_id, data FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall():
+                job = json.loads(data)
+                if now - heartbeats.get(job.get("owner"), 0) > self.heartbeat_timeout:
+                    job.update(status=FAILED, error="Interrupted by server restart", finished_at=now)
+                    self._write(job)
+            self._db.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - self.heartbeat_timeout,))
+
+    def close(self) -> None:
+        """Sign this worker off, so peers fail whatever it left unfinished right away"""
+        with self._transaction():
+            self._db.execute("DELETE FROM workers WHERE owner = ?", (self.owner,))
+        self._db.close()
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, data, finished_at) VALUES (?, ?, ?, ?)",
+            (job["job_id"], job["status"], json.dumps(job), job["finished_at"])
+        )
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create(self, job: Dict[str, Any]) -> None:
+        job["owner"] = self.owner  # the worker that queued the job and runs it
+        with self._transaction():
+            self._db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+            self._write(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read(job_id)
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._transaction():
+            job = self._read(job_id)
+            if job:
+                job.update(fields)
+                self._write(job)
+
+    def update_if(self, job_id: str, statuses: Iterable[str], **fields) -> bool:
+        """Apply fields only if the job is still in one of statuses; returns whether it was"""
+        with self._transaction():
+            job = self._read(job_id)
+            if not job or job["status"] not in statuses:
+                return False
+            job.update(fields)
+            self._write(job)
+            return True
+
+    def append_clauses(self, job_id: str, legal_items: List[Dict[str, Any]]) -> None:
+        with self._transaction():
+            job = self._read(job_id)
+            if job:
+                job["legal_analysis"].extend(legal_items)
+                self._write(job)
+
+class JobScheduler:
+    def __init__(self, store, handler: Callable[[str, Any], Awaitable[Dict[str, Any]]],
+                 max_concurrent: int = 5, max_queued: int = 20, timeout: int = 300,
+                 cleanup: Optional[Callable[[Any], None]] = None):
+        """
+        Initialize the scheduler
+
+        Args:
+            store: Job store holding job records
+            handler: Coroutine function (job_id, payload) -> final result dict
+            max_concurrent: Jobs processed at the same time
+            max_queued: Jobs waiting before new submissions are rejected
+            timeout: Seconds a job may run before it is stopped
+            cleanup: Called with the payload once a job ends, whatever its outcome
+        """
+        self.store = store
+        self.handler = handler
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.cleanup = cleanup
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._payloads: Dict[str, Any] = {}
+        self.draining = False  # set on shutdown; new submissions are refused
+
+    def start(self) -> None:
+        """Start the worker tasks (idempotent, needs a running event loop)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.max_concurrent)
+        ]
+        self._heartbeat_task = asyncio.create_task(self._heartbeat(), name="job-heartbeat")
+
+    async def drain(self, timeout: float) -> None:
+        """Refuse new jobs, give queued and running ones up to timeout seconds to finish, then shut down"""
+        self.draining = True
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Shutting down with {len(self._running)} running and {self.queue_depth()} queued jobs")
+        await self.shutdown()
+
+    async def shutdown(self) -> None:
+        """Cancel running jobs and stop the workers"""
+        for task in list(self._running.values()):
+            task.cancel()
+        tasks = self._workers + ([self._heartbeat_task] if self._heartbeat_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._heartbeat_task = None
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+
+    def submit(self, job: Dict[str, Any], payload: Any) -> None:
+        """Queue a new job; raises QueueFullError when the queue is at capacity"""
+        if self.draining:
+            raise QueueFullError("Server is shutting down")
+        self.start()
+        if self._queue.full():
+            raise QueueFullError(f"Job queue is full ({self.max_queued} waiting)")
+        self.store.create(job)
+        self._payloads[job["job_id"]] = payload
+        self._queue.put_nowait(job["job_id"])
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job. Returns False if it had already finished.
+        A job running in another worker process sees the cancellation within
+        CANCEL_POLL_SECONDS and stops there.
+        """
+        if job_id in self._running:
+            self._running[job_id].cancel()  # the worker records the cancellation
+            return True
+        return self.store.update_if(job_id, (QUEUED, RUNNING), status=CANCELLED, finished_at=time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": len(self._running),
+            "queued": self.queue_depth(),
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "draining": self.draining,
+        }
+
+    async def _heartbeat(self) -> None:
+        """Keep this worker's jobs from being taken for interrupted ones"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                self.store.heartbeat()
+            except Exception as e:
+                logger.error(f"Job store heartbeat failed: {str(e)}")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            payload = self._payloads.pop(job_id, None)
+            try:
+                job = self.store.get(job_id)
+                if job and job["status"] == QUEUED:
+                    await self._run(job_id, payload)
+            except Exception as e:
+                logger.error(f"Job worker error on {job_id}: {str(e)}")
+            finally:
+                if self.cleanup and payload is not None:
+                    self.cleanup(payload)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, payload: Any) -> None:
+        if not self.store.update_if(job_id, (QUEUED,), status=RUNNING, started_at=time.time()):
+            return  # cancelled by another worker meanwhile
+        task = asyncio.create_task(asyncio.wait_for(self.handler(job_id, payload), self.timeout))
+        self._running[job_id] = task
+        # Terminal states are only written while the job is still RUNNING, so a
+        # cancellation recorded by another worker is never overwritten
+        try:
+            result = await self._watch(job_id, task)
+            self.store.update_if(job_id, (RUNNING,), status=COMPLETED, result=result, finished_at=time.time())
+        except asyncio.TimeoutError:
+            self.store.update_if(job_id, (RUNNING,), status=TIMED_OUT, error=f"Job exceeded {self.timeout}s", finished_at=time.time())
+        except asyncio.CancelledError:
+            self.store.update_if(job_id, (RUNNING,), status=CANCELLED, finished_at=time.time())
+            # Re-raise only if the worker itself is being shut down
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update_if(job_id, (RUNNING,), status=FAILED, error=str(e), finished_at=time.time())
+        finally:
+            self._running.pop(job_id, None)
+
+    async def _watch(self, job_id: str, task: asyncio.Task) -> Any:
+        """Await a running job, stopping it if its record was cancelled by another worker"""
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=CANCEL_POLL_SECONDS)
+                if not task.done():
+                    job = self.store.get(job_id)
+                    if job and job["status"] == CANCELLED:
+                        task.cancel()
+        except asyncio.CancelledError:
+            task.cancel()  # asyncio.wait doesn't pass our cancellation on
+            raise
+        return await task
@@ -0,0 +1,78 @@
+"""
+Incremental parsing of JSON arrays of objects
+Pulls each complete top-level object out of a model response while it is
+still streaming, and keeps every complete object of a truncated response
+"""
+
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+class JSONArrayStreamParser:
+    """
+    Feed text as it arrives; each call returns the objects of the top-level
+    array completed by that text. Anything before the opening "[" (markdown
+    fences, preamble) is skipped, as is anything after the closing "]".
+    """
+
+    def __init__(self):
+        self._started = False
+        self._depth = 0  # 1 = directly inside the top-level array
+        self._in_string = False
+        self._escaped = False
+        self._current: List[str] = []  # characters of the element being read
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume the next piece of text and return the objects it completed"""
+        objects = []
+        for char in text:
+            if not self._started:
+                if char == "[":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._depth == 0:
+                continue  # array already closed
+
+            if self._in_string:
+                if self._depth > 1:
+                    self._current.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and char == "}":
+                    self._current.append(char)
+                    self._emit(objects)
+                    continue
+
+            if self._depth > 1:
+                self._current.append(char)
+        return objects
+
+    def _emit(self, objects: List[Dict[str, Any]]) -> None:
+        element = "".join(self._current)
+        self._current = []
+        try:
+            item = json.loads(element)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping malformed object in streamed JSON: {str(e)}")
+            return
+        if isinstance(item, dict):
+            objects.append(item)
+
+def complete_objects(text: str) -> List[Dict[str, Any]]:
+    """Every complete object in the top-level array of text, even if the array itself is truncated"""
+    return JSONArrayStreamParser().feed(text)
@@ -0,0 +1,150 @@
+"""
+Prompt compaction for extracted document text
+Strips per-page boilerplate (running headers/footers, page numbers) and OCR
+noise, rejoins hyphenated and wrapped lines and collapses whitespace, so
+fewer tokens are sent to Gemini for the same content
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from document_chunker import CLAUSE_BOUNDARY, HEADING, estimate_tokens
+
+# Lines at the top and bottom of each page checked for running headers/footers
+EDGE_LINES = 3
+
+# A header/footer must repeat on at least this share of pages (and on 2 pages)
+MIN_BOILERPLATE_SHARE = 0.5
+
+# Running headers/footers are short; longer lines are always kept
+MAX_BOILERPLATE_WORDS = 10
+
+# "12", "- 12 -", "Page 3", "Page 3 of 10", "3/10"
+PAGE_NUMBER = re.compile(r"^\s*(page\s*)?[-–—]?\s*\d+\s*[-–—]?(\s*(of|/)\s*\d+)?\s*$", re.IGNORECASE)
+
+# "agree-\nment" -> "agreement"
+HYPHEN_BREAK = re.compile(r"([a-z])-\n([a-z])")
+
+SENTENCE_END = re.compile(r"[.;:!?]$")
+SPACES = re.compile(r"[ \t\u00a0]+")
+ALPHANUMERIC = re.compile(r"\w")
+
+# Tesseract's sparse-text mode (psm 11) puts a blank line after every line it
+# reads; text where at least this share of lines is followed by one is double-spaced
+OCR_DOUBLE_SPACED_SHARE = 0.6
+
+# "12. Termination", "Section 4 Fees and Payment" - short numbered lines whose
+# words (other than short connectors) are capitalized
+NUMBERED_HEADING_MAX_WORDS = 6
+LOWERCASE_WORD = re.compile(r"\b[a-z][a-z]{3,}\b")
+
+def _signature(line: str) -> str:
+    """Line identity for header/footer detection, ignoring case, spacing and numbers"""
+    return re.sub(r"\d+", "#", SPACES.sub(" ", line.strip().lower()))
+
+def _edge_indices(lines: List[str]) -> List[int]:
+    """Indices of the first and last EDGE_LINES non-empty lines of a page"""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(filled[:EDGE_LINES] + filled[-EDGE_LINES:]))
+
+def _is_boilerplate_candidate(line: str) -> bool:
+    """Short lines that don't start a numbered clause may be headers or footers"""
+    return len(line.split()) <= MAX_BOILERPLATE_WORDS and not CLAUSE_BOUNDARY.match(line)
+
+def find_boilerplate(pages: List[List[str]]) -> set:
+    """Signatures of header/footer lines repeated across pages"""
+    counts = Counter()
+    for lines in pages:
+        counts.update({
+            _signature(lines[i]) for i in _edge_indices(lines) if _is_boilerplate_candidate(lines[i])
+        })
+    threshold = max(2, MIN_BOILERPLATE_SHARE * len(pages))
+    return {signature for signature, count in counts.items() if count >= threshold}
+
+def _is_heading(line: str) -> bool:
+    """All-caps headings and short numbered headings, which end a clause's first line"""
+    if HEADING.match(line):
+        return True
+    return bool(
+        CLAUSE_BOUNDARY.match(line) and len(line.split()) <= NUMBERED_HEADING_MAX_WORDS
+        and not LOWERCASE_WORD.search(line)
+    )
+
+def merge_ocr_double_spacing(text: str) -> str:
+    """
+    Remove the blank line OCR leaves after every wrapped line, which would
+    otherwise split each line into its own clause. Text that is not
+    double-spaced is returned unchanged. A blank line is kept where the
+    previous line ends a sentence or is a heading, or the next one starts
+    a clause; a next line starting in lowercase always continues the sentence.
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    filled = [i for i, line in enumerate(lines[:-1]) if line]
+    if not filled or sum(1 for i in filled if not lines[i + 1]) < OCR_DOUBLE_SPACED_SHARE * len(filled):
+        return text
+
+    merged = []
+    for i, line in enumerate(lines):
+        following = lines[i + 1] if i + 1 < len(lines) else ""
+        if not line and merged and merged[-1] and following:
+            previous = merged[-1]
+            ends = SENTENCE_END.search(previous) or _is_heading(previous)
+            starts = CLAUSE_BOUNDARY.match(following) or HEADING.match(following)
+            if not starts and (following[0].islower() or not ends):
+                continue
+        merged.append(line)
+    return "\n".join(merged)
+
+def _join_wrapped_lines(lines: List[str]) -> List[str]:
+    """Join a line with the next when the sentence visibly continues there"""
+    joined = []
+    for line in lines:
+        previous = joined[-1] if joined else ""
+        continues = (
+            previous and line and line[0].islower()
+            and not SENTENCE_END.search(previous)
+            and not CLAUSE_BOUNDARY.match(line) and not HEADING.match(line)
+        )
+        if continues:
+            joined[-1] = f"{previous} {line}"
+        else:
+            joined.append(line)
+    return joined
+
+def compact_pages(pages: List[str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Compact the per-page text of one document into a single prompt-ready text
+
+    Args:
+        pages: Extracted text of each page, in page order
+
+    Returns:
+        Tuple of (text, stats) where stats holds tokens_before, tokens_after
+        and boilerplate_lines (header/footer/page number lines removed)
+    """
+    tokens_before = estimate_tokens("\n".join(pages))
+    page_lines = [HYPHEN_BREAK.sub(r"\1\2", merge_ocr_double_spacing(page)).splitlines() for page in pages]
+    boilerplate = find_boilerplate(page_lines) if len(pages) > 1 else set()
+
+    removed = 0
+    lines = []
+    for page in page_lines:
+        edges = set(_edge_indices(page))
+        for i, line in enumerate(page):
+            line = SPACES.sub(" ", line).strip()
+            if i in edges and (PAGE_NUMBER.match(line) or (
+                    _is_boilerplate_candidate(line) and _signature(line) in boilerplate)):
+                removed += 1
+                continue
+            if line and not ALPHANUMERIC.search(line):
+                continue  # OCR noise: rules, bullets, stray symbols
+            if line or (lines and lines[-1]):
+                lines.append(line)  # keep single blank lines - they separate clauses
+
+    text = "\n".join(_join_wrapped_lines(lines)).strip()
+    return text, {
+        "tokens_before": tokens_before,
+        "tokens_after": estimate_tokens(text),
+        "boilerplate_lines": removed,
+    }
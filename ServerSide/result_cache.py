@@ -0,0 +1,130 @@
+"""
+Bounded result cache with LRU eviction and TTL
+Keeps analysis results in memory, or in SQLite so they survive restarts
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+def make_cache_key(*parts: str) -> str:
+    """Combine key parts (content hash, model, prompt version...) into one key"""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+class ResultCache:
+    def __init__(self, max_entries: int = 256, ttl_seconds: int = 86400,
+                 backend: str = "memory", db_path: Optional[str] = None):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Entries kept before least-recently-used ones are evicted
+            ttl_seconds: Seconds an entry stays valid (0 disables expiry)
+            backend: "memory" or "sqlite"
+            db_path: SQLite database file, required for the sqlite backend
+        """
+        if backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown cache backend: {backend}")
+        if backend == "sqlite" and not db_path:
+            raise ValueError("db_path is required for the sqlite cache backend")
+
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value), memory backend only
+        self._db = None
+
+        if backend == "sqlite":
+            # The cache directory is not created on import, so it may not exist yet
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expiry(self) -> float:
+        return time.time() + self.ttl_seconds if self.ttl_seconds > 0 else float("inf")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry"""
+        with self._lock:
+            now = time.time()
+            value = None
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    self._db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                elif row:
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+            else:
+                entry = self._entries.get(key)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    value = entry[1]
+                elif entry:
+                    del self._entries[key]
+
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value, evicting the least recently used entries"""
+        with self._lock:
+            expires_at = self._expiry()
+
+            if self._db is not None:
+                # SQLite stores infinity as a REAL just fine
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, time.time())
+                )
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+            else:
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        """Number of stored entries (expired ones included until next access)"""
+        with self._lock:
+            if self._db is not None:
+                return self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for health reporting"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": self.size(),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,26 @@
+from fastapi.testclient import TestClient
+
+import api
+
+def test_oversized_request_reports_limit_in_readable_units(monkeypatch):
+    monkeypatch.setattr(api.settings, "MAX_REQUEST_SIZE", 500)
+    client = TestClient(api.app)
+    response = client.post("/analyze-legal-document", files=[("files", ("a.pdf", b"%PDF" + b"0" * 1000))])
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Upload exceeds the 500 bytes request limit"
+
+def test_default_request_limit_fits_a_full_batch_of_files():
+    settings = api.settings
+    assert settings.MAX_REQUEST_SIZE > settings.MAX_FILES_PER_REQUEST * settings.MAX_FILE_SIZE
+
+def test_too_many_files_are_rejected():
+    client = TestClient(api.app)
+    files = [("files", (f"{i}.pdf", b"%PDF")) for i in range(api.settings.MAX_FILES_PER_REQUEST + 1)]
+    response = client.post("/analyze-legal-document", files=files)
+    assert response.status_code == 400
+    assert "files allowed per request" in response.json()["detail"]
+
+def test_format_size():
+    assert api.format_size(50_000_000) == "50MB"
+    assert api.format_size(1_500_000_000) == "1.5GB"
+    assert api.format_size(512) == "512 bytes"
@@ -0,0 +1,32 @@
+from clause_triage import triage_clauses
+
+# Tesseract's sparse-text mode leaves a blank line after every wrapped line,
+# which must not split clauses into fragments
+OCR_PAGE = """1. The Customer shall pay each invoice within thirty (30) days
+
+of receipt; late payments accrue interest at 2% per month.
+
+2. Either party may terminate this Agreement if the other
+
+party commits a material breach and fails to cure the material
+
+breach within fifteen days of written notice from the other
+
+party.
+
+3. The Supplier shall indemnify the Customer against all losses
+
+and damages arising from third party claims.
+
+4. The Supplier shall provide monthly progress reports to the
+
+Customer's project lead by the fifth day of each month.
+"""
+
+def test_double_spaced_ocr_clauses_stay_whole():
+    candidates, local = triage_clauses(OCR_PAGE)
+    assert len(candidates) == 3
+    assert len(local) == 1
+    clause = candidates[1][1]
+    assert clause.startswith("2. Either party")
+    assert clause.endswith("party.")
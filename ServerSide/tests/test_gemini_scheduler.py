@@ -0,0 +1,33 @@
+import asyncio
+
+from gemini_scheduler import FakeGeminiBackend, GeminiScheduler
+
+def make_scheduler():
+    backend = FakeGeminiBackend(latency=0.05)
+    return GeminiScheduler(backend, requests_per_minute=100000, backoff_base=0.01)
+
+def test_caller_after_cancelled_waiter_gets_a_result():
+    scheduler = make_scheduler()
+
+    async def run():
+        first = asyncio.ensure_future(scheduler.generate_async("same prompt"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0)  # first waiter leaves and cancels the shared call
+        second = await scheduler.generate_async("same prompt")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.cancelled()
+    assert isinstance(second, str) and second
+
+def test_concurrent_identical_prompts_share_one_call():
+    scheduler = make_scheduler()
+
+    async def run():
+        return await asyncio.gather(*(scheduler.generate_async("same prompt") for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(set(results)) == 1
+    assert scheduler.calls == 1
+    assert scheduler.coalesced == 2
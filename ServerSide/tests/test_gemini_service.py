@@ -0,0 +1,36 @@
+import asyncio
+
+from gemini_scheduler import FakeGeminiBackend, GeminiScheduler
+from gemini_service import GeminiLegalAnalyzer
+
+DOCUMENT = "\n\n".join([
+    "WHEREAS the parties wish to set out the terms on which the Services are provided.",
+    "1. The Customer shall pay each invoice within 30 days; late payments accrue interest at 2% per month.",
+    "2. The Supplier shall keep its offices tidy and its staff well presented at all reasonable times.",
+    "3. Either party may terminate this Agreement upon 30 days written notice after a material breach.",
+    "4. The Supplier shall indemnify the Customer against all losses arising from third party claims.",
+    "5. The Supplier shall provide monthly progress reports to the Customer's project lead.",
+    "6. Neither party's aggregate liability shall exceed the fees paid in the preceding twelve months.",
+])
+
+def make_analyzer(**options):
+    backend = FakeGeminiBackend(latency=0.01, jitter=0.05, seed=3)
+    scheduler = GeminiScheduler(backend, requests_per_minute=100000, backoff_base=0.01)
+    return GeminiLegalAnalyzer("test-key", scheduler=scheduler, json_mode=False, **options)
+
+def clause_numbers(analyses):
+    return [analysis["clause"].split()[0] for analysis in analyses]
+
+def test_streamed_analysis_fills_document_ordered_result():
+    analyzer = make_analyzer(chunk_max_tokens=30)
+
+    async def run():
+        streamed, ordered = [], []
+        async for analysis in analyzer.iter_document_analysis_async(DOCUMENT, ordered=ordered):
+            streamed.append(analysis)
+        return streamed, ordered, await analyzer.analyze_legal_document_async(DOCUMENT)
+
+    streamed, ordered, expected = asyncio.run(run())
+    assert clause_numbers(ordered) == clause_numbers(expected)
+    assert clause_numbers(ordered) == ["WHEREAS", "1.", "2.", "3.", "4.", "5.", "6."]
+    assert sorted(clause_numbers(streamed)) == sorted(clause_numbers(ordered))
@@ -0,0 +1,35 @@
+import time
+
+from job_queue import FAILED, QUEUED, SQLiteJobStore, new_job_record
+
+def test_jobs_of_a_live_worker_are_left_alone(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    owner, peer = SQLiteJobStore(path), SQLiteJobStore(path)
+    job = new_job_record(["a.pdf"])
+    owner.create(job)
+
+    peer.heartbeat()
+    assert peer.get(job["job_id"])["status"] == QUEUED
+
+def test_jobs_of_a_worker_that_shut_down_are_failed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    owner, peer = SQLiteJobStore(path), SQLiteJobStore(path)
+    job = new_job_record(["a.pdf"])
+    owner.create(job)
+    owner.close()
+
+    peer.heartbeat()
+    assert peer.get(job["job_id"])["status"] == FAILED
+
+def test_jobs_of_a_silent_worker_are_failed_after_the_timeout(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    owner = SQLiteJobStore(path, heartbeat_timeout=0.2)
+    peer = SQLiteJobStore(path, heartbeat_timeout=0.2)
+    job = new_job_record(["a.pdf"])
+    owner.create(job)
+
+    time.sleep(0.3)  # the owner misses its heartbeat (e.g. killed)
+    peer.heartbeat()
+    record = peer.get(job["job_id"])
+    assert record["status"] == FAILED
+    assert record["error"] == "Interrupted by server restart"
@@ -0,0 +1,70 @@
+from concurrent.futures import Future
+
+import fitz  # PyMuPDF
+
+import text_extractor
+from document_chunker import split_into_clauses
+from text_extractor import extract_text_layer, find_boxed_regions, may_contain_table
+
+PARAGRAPHS = [
+    "The Supplier shall deliver the Services described in the order form with reasonable skill and care.",
+    "The Customer shall pay every undisputed invoice within thirty days of the invoice date.",
+    "Either party may terminate this agreement by giving the other party ninety days written notice.",
+    "This agreement is governed by the laws of England and Wales and the courts of London decide disputes.",
+]
+
+def make_page(doc):
+    page = doc.new_page()
+    y = 72
+    for paragraph in PARAGRAPHS:
+        page.insert_textbox(fitz.Rect(72, y, 520, y + 60), paragraph, fontsize=10)
+        y += 90
+    return page
+
+def test_text_layer_paragraphs_stay_separate_segments():
+    doc = fitz.open()
+    text = extract_text_layer(make_page(doc))
+
+    segments = split_into_clauses(text)
+    assert len(segments) == len(PARAGRAPHS)
+    for segment, paragraph in zip(segments, PARAGRAPHS):
+        assert " ".join(segment.split()) == paragraph
+
+def test_underlines_do_not_trigger_table_detection():
+    doc = fitz.open()
+    page = doc.new_page()
+    for y in range(80, 400, 40):
+        page.draw_line((72, y), (400, y))
+    assert not may_contain_table(page.get_drawings())
+
+def test_ruled_table_is_found():
+    doc = fitz.open()
+    page = doc.new_page()
+    for row in range(4):
+        page.draw_line((72, 100 + row * 24), (472, 100 + row * 24))
+    for col in range(5):
+        page.draw_line((72 + col * 100, 100), (72 + col * 100, 172))
+    assert may_contain_table(page.get_drawings())
+    assert any(box.contains(fitz.Point(272, 136)) for box in find_boxed_regions(page))
+
+class RecordingCache:
+    def __init__(self):
+        self.stored = {}
+
+    def set(self, key, value):
+        self.stored[key] = value
+
+def finished_ocr(text):
+    future = Future()
+    future.set_result([{"page": 1, "source": text_extractor.SOURCE_OCR, "text": text, "seconds": 0.0, "timings": {}}])
+    return future
+
+def test_pages_ocrd_below_configured_dpi_are_not_cached():
+    cache = RecordingCache()
+    low_dpi = text_extractor.ocr_dpi() - 50
+    pages = text_extractor._ocr_results(finished_ocr("blurry"), [0], {0: "key"}, cache, low_dpi)
+    assert pages[0]["text"] == "blurry"
+    assert cache.stored == {}
+
+    text_extractor._ocr_results(finished_ocr("sharp"), [0], {0: "key"}, cache, text_extractor.ocr_dpi())
+    assert cache.stored == {"key": "sharp"}
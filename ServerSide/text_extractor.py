@@ -1,63 +1,750 @@
 import os
+import re
+import hashlib
 import fitz  # PyMuPDF
 import pytesseract
 import cv2
 import numpy as np
-from PIL import Image
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+from collections import deque
 import time
 
-def process_page(page):
+from config import settings
+from result_cache import ResultCache
+from metrics import EXTRACTED_PAGES, collect_timings, record_stage, span
+
+# Boxes smaller than this are treated as artifacts - same thresholds as the
+# OCR mask in process_page (50x30 px at 150 DPI), expressed in PDF points
+MIN_BOX_WIDTH_PT = 50 * 72 / 150
+MIN_BOX_HEIGHT_PT = 30 * 72 / 150
+
+# Straight segments at least this long count as table rules; find_tables() only
+# runs when a page has two horizontal and two vertical ones (rectangles count as both)
+MIN_RULE_PT = 10
+
+# Text layers shorter than this, or with too many non-printable characters,
+# are treated as missing and the page is sent to OCR instead
+MIN_TEXT_LAYER_CHARS = 20
+MIN_TEXT_LAYER_QUALITY = 0.85
+
+SOURCE_TEXT_LAYER = "text_layer"
+SOURCE_OCR = "ocr"
+
+# Upper bound on pages per OCR pool task; each task reopens the PDF
+OCR_PAGES_PER_TASK = 4
+
+# Fixed-mode OCR resolution
+OCR_DPI = 150
+
+# Peak memory of OCR'ing one page, per rendered pixel: the grayscale render,
+# blur/edge/label images, Tesseract's copies and the decoded page image
+OCR_BYTES_PER_PIXEL = 12
+
+# Bump when OCR output for an unchanged page would differ, to invalidate the page cache
+PAGE_CACHE_VERSION = "2"
+
+PDF_REFERENCE = re.compile(rb"(\d+) 0 R")
+
+# Guards the /Parent walk for inherited page resources against cyclic page trees
+PAGE_TREE_MAX_DEPTH = 32
+
+# Adaptive OCR: text regions are re-rendered so a line of text is about this
+# many pixels tall, which is where Tesseract is most accurate
+TARGET_LINE_HEIGHT_PX = 32
+# Pages with more regions than this are OCR'd as one block instead
+MAX_OCR_REGIONS = 12
+
+class PytesseractBackend:
+    """OCR through the tesseract CLI - starts a new process (and reloads language data) per call"""
+    name = "pytesseract"
+
+    def image_to_string(self, image, psm=11, dpi=None):
+        config = f'--oem 3 --psm {psm}'
+        if dpi:
+            config += f' --dpi {dpi}'
+        return pytesseract.image_to_string(image, config=config)
+
+class TesserocrBackend:
+    """
+    OCR through libtesseract in-process. The engine is initialized once per
+    thread and reused for every page and request, so the per-call process
+    start and language-data load are gone.
+    """
+    name = "tesserocr"
+
+    def __init__(self, lang="eng"):
+        import tesserocr  # optional dependency
+        self._tesserocr = tesserocr
+        self.lang = lang
+        self._local = threading.local()
+        self._engine()  # fail fast if the library or language data is missing
+
+    def _engine(self):
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = self._tesserocr.PyTessBaseAPI(lang=self.lang, oem=self._tesserocr.OEM.DEFAULT)
+            self._local.engine = engine
+        return engine
+
+    def image_to_string(self, image, psm=11, dpi=None):
+        engine = self._engine()
+        engine.SetPageSegMode(psm)
+        image = np.ascontiguousarray(image)
+        height, width = image.shape
+        engine.SetImageBytes(image.tobytes(), width, height, 1, width)
+        if dpi:
+            engine.SetSourceResolution(dpi)
+        try:
+            return engine.GetUTF8Text()
+        finally:
+            engine.Clear()
+
+# OCR backend for this process, created on first use
+_ocr_backend = None
+_ocr_backend_lock = threading.Lock()
+
+def get_ocr_backend():
+    """
+    Return this process's OCR backend, chosen by OCR_BACKEND:
+    "tesserocr" (persistent in-process engine), "pytesseract" (CLI per call)
+    or "auto" (tesserocr when it is installed, pytesseract otherwise)
+    """
+    global _ocr_backend
+    with _ocr_backend_lock:
+        if _ocr_backend is None:
+            if settings.OCR_BACKEND in ("auto", "tesserocr"):
+                try:
+                    _ocr_backend = TesserocrBackend()
+                except Exception as e:
+                    if settings.OCR_BACKEND == "tesserocr":
+                        print(f"tesserocr unavailable, falling back to pytesseract: {e}")
+            if _ocr_backend is None:
+                _ocr_backend = PytesseractBackend()
+        return _ocr_backend
+
+def render_page_gray(page, dpi=150, clip=None):
+    """
+    Render a page (or the clip area of it) straight to an 8-bit grayscale pixmap.
+    Returns the pixmap and a zero-copy NumPy view of its samples - keep the
+    pixmap referenced for as long as the view is used.
+    """
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False, clip=clip)
+    gray = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    return pix, gray
+
+def detect_boxes(gray, dpi=150):
+    """
+    Find boxed regions (tables, bordered panels) in a grayscale page image.
+    Edge components are measured in one connectedComponentsWithStats pass and
+    filtered as a NumPy array, instead of looping over every contour.
+
+    Returns:
+        Array of (x, y, w, h) rows, one per box
+    """
+    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    edged = cv2.Canny(blur, 30, 50)
+    try:
+        # 16-bit labels halve the label image; very noisy scans can overflow them
+        _, _, stats, _ = cv2.connectedComponentsWithStats(edged, connectivity=8, ltype=cv2.CV_16U)
+    except cv2.error:
+        _, _, stats, _ = cv2.connectedComponentsWithStats(edged, connectivity=8, ltype=cv2.CV_32S)
+
+    # Row 0 is the background; ignore small artifacts (50x30 px at 150 DPI)
+    boxes = stats[1:, :4]
+    scale = dpi / 150
+    keep = (boxes[:, 2] > 50 * scale) & (boxes[:, 3] > 30 * scale)
+    return boxes[keep]
+
+def mask_boxes(gray, boxes, fill=0):
+    """Blank out boxed regions in place (black by default, like the old cv2.rectangle mask)"""
+    for x, y, w, h in boxes:
+        gray[y:y + h + 1, x:x + w + 1] = fill
+
+def process_page(page, dpi=OCR_DPI):
     """
     Process a single PDF page to extract text while excluding tables
     """
     try:
-        # Step 1: Convert PDF page to image
-        pix = page.get_pixmap(dpi=150)  # use lower DPI for speed
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        image = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-
-        # Step 2: Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-        # Step 3: Detect rectangular box contours
-        blur = cv2.GaussianBlur(gray, (5, 5), 0)
-        edged = cv2.Canny(blur, 30, 50)
-        contours, _ = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        # Step 4: Create mask and remove boxed areas
-        mask = np.ones(gray.shape, dtype="uint8") * 255
-        for cnt in contours:
-            x, y, w, h = cv2.boundingRect(cnt)
-            if w > 50 and h > 30:  # ignore small artifacts
-                cv2.rectangle(mask, (x, y), (x + w, y + h), 0, -1)
-
-        # Step 5: Mask out boxes and apply OCR
-        unboxed_area = cv2.bitwise_and(gray, gray, mask=mask)
-        config = r'--oem 3 --psm 11'  # fast sparse text config
-        text = pytesseract.image_to_string(unboxed_area, config=config)
+        # Step 1: Render the page straight to grayscale
+        with span("rasterize"):
+            pix, gray = render_page_gray(page, dpi=dpi)  # use lower DPI for speed
+
+        # Step 2: Detect boxed areas and mask them out in place
+        with span("mask"):
+            mask_boxes(gray, detect_boxes(gray, dpi=dpi))
 
+        # Step 3: Apply OCR
+        with span("ocr"):
+            text = get_ocr_backend().image_to_string(gray, psm=11, dpi=dpi)  # fast sparse text mode
+
+        del gray, pix  # the view first - the pixmap's buffer can't be freed while it is exported
         return text
     except Exception as e:
         print(f"Error processing page: {e}")
         return ""
 
-def extract_text_fast(pdf_path):
+def estimate_line_height(binary):
+    """Median height in pixels of the text lines in a binarized (ink = 255) image"""
+    # Join neighbouring characters horizontally so each component is a line fragment
+    lines = cv2.dilate(binary, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8, ltype=cv2.CV_32S)
+    widths, heights = stats[1:, 2], stats[1:, 3]
+    heights = heights[(widths > heights) & (heights > 2)]
+    return float(np.median(heights)) if len(heights) else None
+
+def count_text_lines(binary):
+    """Number of separate bands of inked rows in a binarized region"""
+    rows = binary.any(axis=1)
+    return int(np.count_nonzero(rows[1:] & ~rows[:-1]) + rows[0])
+
+def find_text_regions(binary, line_height):
     """
-    Extract text from PDF while excluding tables and boxed content
+    Group ink into text blocks (paragraphs, headings, numbered lines).
+    Returns (x, y, w, h) rows sorted top-to-bottom, then left-to-right.
+    """
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT,
+        (max(3, int(line_height * 1.5)), max(3, int(line_height * 0.8)))
+    )
+    blocks = cv2.dilate(binary, kernel)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(blocks, connectivity=8, ltype=cv2.CV_32S)
+    regions = stats[1:, :4]
+    regions = regions[(regions[:, 2] > line_height) & (regions[:, 3] >= line_height * 0.5)]
+    return regions[np.lexsort((regions[:, 0], regions[:, 1]))]
+
+def process_page_adaptive(page, max_dpi=None):
     """
+    Adaptive-resolution OCR: find text regions on a cheap low-DPI render,
+    re-render only those regions at a DPI chosen from the measured line
+    height, and OCR each with a page segmentation mode that fits its shape.
+    Boxed regions (tables) are excluded as in process_page.
+    max_dpi lowers the OCR_HIGH_DPI cap on region renders.
+    """
+    high_dpi = min(settings.OCR_HIGH_DPI, max_dpi or settings.OCR_HIGH_DPI)
+    if page.rotation:
+        return process_page(page, min(OCR_DPI, high_dpi))  # clip rectangles below assume an unrotated page
+
     try:
-        doc = fitz.open(pdf_path)
-        max_threads = min(os.cpu_count() or 4, 4)  # Limit threads for stability
-        
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            results = executor.map(process_page, [doc[i] for i in range(len(doc))])
-        
+        low_dpi = settings.OCR_LOW_DPI
+
+        # Step 1: Cheap low-DPI render, boxes blanked to white so they don't look like ink
+        with span("rasterize"):
+            pix, gray = render_page_gray(page, dpi=low_dpi)
+        with span("mask"):
+            boxes = detect_boxes(gray, dpi=low_dpi)
+            mask_boxes(gray, boxes, fill=255)
+            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        del pix, gray
+
+        # Step 2: Measure the text size and locate text regions
+        with span("layout"):
+            line_height = estimate_line_height(binary)
+            regions = find_text_regions(binary, line_height) if line_height else []
+        if line_height is None:
+            return ""  # blank page
+        if len(regions) == 0:
+            return ""
+
+        to_points = 72 / low_dpi
+        pad = line_height * 0.3
+
+        if len(regions) > MAX_OCR_REGIONS:
+            # Too many small regions to OCR one by one - use their combined extent
+            x0, y0 = regions[:, 0].min(), regions[:, 1].min()
+            x1, y1 = (regions[:, 0] + regions[:, 2]).max(), (regions[:, 1] + regions[:, 3]).max()
+            regions = np.array([[x0, y0, x1 - x0, y1 - y0]])
+
+        texts = []
+        for x, y, w, h in regions:
+            # Step 3: Re-render just this region - small print gets more pixels, large print fewer
+            region_line_height = estimate_line_height(binary[y:y + h, x:x + w]) or line_height
+            dpi = int(min(max(TARGET_LINE_HEIGHT_PX * low_dpi / region_line_height, OCR_DPI), high_dpi))
+            clip = fitz.Rect(
+                (x - pad) * to_points, (y - pad) * to_points,
+                (x + w + pad) * to_points, (y + h + pad) * to_points
+            ) + (page.rect.x0, page.rect.y0, page.rect.x0, page.rect.y0)
+            clip &= page.rect
+            with span("rasterize"):
+                region_pix, region = render_page_gray(page, dpi=dpi, clip=clip)
+
+            # Blank any boxes overlapping this region, in region pixel coordinates
+            scale = dpi / low_dpi
+            offset_x = (clip.x0 - page.rect.x0) * dpi / 72
+            offset_y = (clip.y0 - page.rect.y0) * dpi / 72
+            for bx, by, bw, bh in boxes:
+                left, top = int(bx * scale - offset_x), int(by * scale - offset_y)
+                right, bottom = int((bx + bw) * scale - offset_x) + 1, int((by + bh) * scale - offset_y) + 1
+                region[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)] = 255
+
+            # Step 4: OCR with a segmentation mode suited to the region
+            psm = 7 if count_text_lines(binary[y:y + h, x:x + w]) <= 1 else 6
+            with span("ocr"):
+                text = get_ocr_backend().image_to_string(region, psm=psm, dpi=dpi)
+            if text.strip():
+                texts.append(text.strip())
+            del region_pix, region
+
+        return "\n".join(texts)
+    except Exception as e:
+        print(f"Error in adaptive OCR, falling back to fixed DPI: {e}")
+        return process_page(page, min(OCR_DPI, high_dpi))
+
+def ocr_page(page, dpi=None):
+    """
+    OCR a page with the configured OCR_MODE ("fixed" or "adaptive").
+    dpi, if given, replaces the fixed-mode resolution or caps the adaptive one.
+    """
+    if settings.OCR_MODE == "adaptive":
+        return process_page_adaptive(page, max_dpi=dpi)
+    return process_page(page, dpi or OCR_DPI)
+
+def ocr_dpi():
+    """Highest resolution the configured OCR_MODE renders at"""
+    return settings.OCR_HIGH_DPI if settings.OCR_MODE == "adaptive" else OCR_DPI
+
+def plan_ocr(doc, page_indices, budget_mb=None):
+    """
+    Choose how many pages of a document to OCR at once, and the highest DPI,
+    so that the pages in flight fit the per-document memory budget.
+    Parallelism is reduced first; the DPI only once a single page is too big.
+
+    Args:
+        doc: Open document
+        page_indices: Pages that will be OCR'd
+        budget_mb: Memory budget (defaults to settings.OCR_MEMORY_BUDGET_MB, 0 = unlimited)
+
+    Returns:
+        Tuple of (parallel pages, dpi)
+    """
+    parallel = max(1, min(settings.OCR_WORKERS, len(page_indices)))
+    dpi = ocr_dpi()
+    budget = (settings.OCR_MEMORY_BUDGET_MB if budget_mb is None else budget_mb) * 1024 * 1024
+    if not budget or not page_indices:
+        return parallel, dpi
+
+    # Page boxes are read without loading the pages; the largest page sets the cost
+    largest = max(doc.page_cropbox(i).get_area() for i in page_indices) / (72 * 72)  # square inches
+    page_bytes = lambda dpi: largest * dpi * dpi * OCR_BYTES_PER_PIXEL
+
+    parallel = max(1, min(parallel, int(budget // page_bytes(dpi))))
+    if page_bytes(dpi) > budget:
+        dpi = max(settings.OCR_MIN_DPI, int((budget / (largest * OCR_BYTES_PER_PIXEL)) ** 0.5))
+    return parallel, dpi
+
+def release_page_memory():
+    """
+    Empty MuPDF's store of decoded images and fonts. It is process-wide and
+    otherwise grows to 256 MB per process on scanned documents, however
+    promptly each page's pixmaps are freed.
+    """
+    fitz.TOOLS.store_shrink(100)
+
+def may_contain_table(drawings):
+    """
+    Whether loose line segments on the page could form a table grid. Pages with
+    only underlines, single rules or curved logos skip the costly find_tables().
+    """
+    horizontal = vertical = 0
+    for drawing in drawings:
+        for item in drawing["items"]:
+            if item[0] == "re":
+                horizontal += 2
+                vertical += 2
+            elif item[0] == "l":
+                start, end = item[1], item[2]
+                if abs(start.y - end.y) < 1 and abs(start.x - end.x) >= MIN_RULE_PT:
+                    horizontal += 1
+                elif abs(start.x - end.x) < 1 and abs(start.y - end.y) >= MIN_RULE_PT:
+                    vertical += 1
+            if horizontal >= 2 and vertical >= 2:
+                return True
+    return False
+
+def find_boxed_regions(page):
+    """
+    Locate boxed areas (tables, bordered panels) from the page's vector drawings.
+    Mirrors the contour mask in process_page without rasterizing the page.
+    """
+    boxes = []
+    drawings = page.get_drawings()
+    for drawing in drawings:
+        # Only shapes that would show up as edges: stroked outlines or
+        # non-white fills (invisible white backgrounds are ignored)
+        fill = drawing.get("fill")
+        visible = drawing.get("color") is not None or (fill is not None and min(fill) < 0.95)
+        rect = drawing["rect"]
+        if visible and rect.width > MIN_BOX_WIDTH_PT and rect.height > MIN_BOX_HEIGHT_PT:
+            boxes.append(rect)
+
+    # Tables drawn as loose line segments never form a single drawing
+    if may_contain_table(drawings):
+        try:
+            boxes.extend(fitz.Rect(table.bbox) for table in page.find_tables().tables)
+        except Exception as e:
+            print(f"Error detecting tables: {e}")
+
+    return boxes
+
+def text_layer_quality(text):
+    """Share of characters in text that look like real, printable content"""
+    if not text:
+        return 0.0
+    printable = sum(1 for ch in text if ch.isprintable() or ch.isspace())
+    replacement = text.count("\ufffd")
+    return max(printable - replacement, 0) / len(text)
+
+def extract_text_layer(page):
+    """
+    Extract the page's embedded text with boxed regions removed geometrically.
+    Returns None when the text layer is empty or looks like garbage.
+    """
+    blocks = page.get_text("blocks", sort=True)
+    raw_text = "".join(block[4] for block in blocks if block[6] == 0)
+
+    # Judge the layer before box removal, so table-only pages don't go to OCR
+    if len(raw_text.strip()) < MIN_TEXT_LAYER_CHARS or text_layer_quality(raw_text) < MIN_TEXT_LAYER_QUALITY:
+        return None
+
+    boxes = find_boxed_regions(page)
+    kept = []
+    for x0, y0, x1, y1, text, _, block_type in blocks:
+        if block_type != 0:
+            continue
+        center = fitz.Point((x0 + x1) / 2, (y0 + y1) / 2)
+        if any(center in box for box in boxes):
+            continue
+        kept.append(text.strip())
+
+    # Blank lines between blocks keep paragraphs apart, as OCR output does
+    return "\n\n".join(kept)
+
+# OCR results of individual pages, keyed on page content - created on first use
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+def get_page_cache():
+    """Return the page-level OCR cache, or None when PAGE_CACHE_ENABLED is off"""
+    global _page_cache
+    if not settings.PAGE_CACHE_ENABLED:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = ResultCache(
+                max_entries=settings.PAGE_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.RESULT_CACHE_TTL,
+                backend=settings.RESULT_CACHE_BACKEND,
+                db_path=os.path.join(settings.MODEL_CACHE_DIR, "page_cache.sqlite3"),
+            )
+        return _page_cache
+
+def page_resources(doc, xref: int) -> str:
+    """
+    The /Resources entry of a page as PDF source, following /Parent up the
+    page tree when the page inherits it ("null" if no node has one)
+    """
+    for _ in range(PAGE_TREE_MAX_DEPTH):
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind != "null":
+            return value
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        if kind != "xref":
+            break
+        xref = int(parent.split()[0])
+    return "null"
+
+def page_content_key(doc, page):
+    """
+    Hash what a page renders from - its content streams, geometry and every
+    object reachable from its resources (fonts, images, form XObjects) -
+    without rendering it. Identical pages in re-uploaded or edited PDFs get
+    the same key.
+    """
+    digest = hashlib.sha256()
+    for part in (PAGE_CACHE_VERSION, settings.OCR_MODE, str(page.rect), str(page.rotation)):
+        digest.update(part.encode() + b"\x1f")
+    digest.update(page.read_contents())
+
+    value = page_resources(doc, page.xref)
+    digest.update(value.encode())
+    pending = [int(ref) for ref in PDF_REFERENCE.findall(value.encode())]
+    # MuPDF's resolved images and fonts as well, so the key covers their
+    # stream bytes even if the /Resources lookup above missed them
+    pending.extend(image[0] for image in page.get_images(full=True))
+    pending.extend(font[0] for font in page.get_fonts(full=True))
+    seen = set()
+    while pending:
+        xref = pending.pop()
+        if xref in seen or xref <= 0 or xref >= doc.xref_length():
+            continue
+        seen.add(xref)
+        obj = doc.xref_object(xref, compressed=True).encode()
+        digest.update(obj)
+        if doc.xref_is_stream(xref):
+            digest.update(doc.xref_stream_raw(xref) or b"")
+        # /Parent links lead back up the page tree, not into the page's resources
+        pending.extend(int(ref) for ref in PDF_REFERENCE.findall(re.sub(rb"/Parent \d+ 0 R", b"", obj)))
+
+    return digest.hexdigest()
+
+# Long-lived OCR worker pool, shared by every request in this process
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def get_ocr_pool():
+    """Return the shared OCR process pool, creating it on first use"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            # spawn, not fork: the API process runs threads and an event loop
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=settings.OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=get_ocr_backend,  # load the OCR engine once per worker
+            )
+        return _ocr_pool
+
+def _worker_pid(_):
+    return os.getpid()
+
+def warm_ocr_pool():
+    """
+    Start the shared OCR pool and wait until every worker process is up with
+    its OCR engine loaded, so the first request doesn't pay for spawning them
+
+    Returns:
+        Number of worker processes started
+    """
+    pool = get_ocr_pool()
+    # One task per worker: a spawn-context pool starts a new process for each task no idle worker takes
+    return len(set(pool.map(_worker_pid, range(settings.OCR_WORKERS))))
+
+def shutdown_ocr_pool(wait=True):
+    """Stop the shared OCR pool; the next extraction starts a fresh one"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        pool, _ocr_pool = _ocr_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=not wait)
+
+def _ocr_page_range(pdf_path, page_indices, dpi=None):
+    """
+    OCR worker: open the PDF by path, render and OCR the given pages.
+    Runs in a pool process, so only plain text and the per-stage timings
+    (recorded by the caller, since metrics live in the parent) go back.
+    Each page's memory is released before the next one, so a worker stays
+    flat however many pages it is given.
+    """
+    results = []
+    doc = fitz.open(pdf_path)
+    try:
+        for i in page_indices:
+            start = time.perf_counter()
+            with collect_timings() as timings:
+                page = doc[i]
+                text = ocr_page(page, dpi)
+                del page
+                release_page_memory()
+            results.append({
+                "page": i + 1,
+                "source": SOURCE_OCR,
+                "text": text,
+                "seconds": round(time.perf_counter() - start, 4),
+                "timings": timings,
+            })
+    finally:
         doc.close()
-        return "\n".join(results)
+    return results
+
+def _split_ranges(page_indices, parts):
+    """
+    Split page indices into contiguous runs, at most `parts` of them and no
+    longer than OCR_PAGES_PER_TASK, so progress is reported as pages finish
+    """
+    size = max(1, min(-(-len(page_indices) // parts), OCR_PAGES_PER_TASK))
+    return [page_indices[i:i + size] for i in range(0, len(page_indices), size)]
+
+def _page_without_ocr(doc, i, page_cache, page_keys):
+    """
+    Try to produce page i without OCR: from its text layer, or from the page
+    cache by content hash. Returns None if the page has to be OCR'd; the cache
+    key used for the lookup is left in page_keys so the OCR result can be stored.
+    """
+    start = time.perf_counter()
+    try:
+        with span("text_layer"):
+            text = extract_text_layer(doc[i])
+    except Exception as e:
+        print(f"Error reading text layer on page {i + 1}: {e}")
+        text = None
+
+    if text is not None:
+        return {
+            "page": i + 1,
+            "source": SOURCE_TEXT_LAYER,
+            "text": text,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+    if page_cache:
+        try:
+            with span("page_cache"):
+                page_keys[i] = page_content_key(doc, doc[i])
+                cached = page_cache.get(page_keys[i])
+        except Exception as e:
+            print(f"Error hashing page {i + 1}: {e}")
+            cached = None
+        if cached is not None:
+            return {
+                "page": i + 1,
+                "source": SOURCE_OCR,
+                "text": cached,
+                "seconds": round(time.perf_counter() - start, 4),
+                "cached": True,
+            }
+    return None
+
+def _ocr_results(future, page_range, page_keys, page_cache, dpi):
+    """
+    Collect the pages of a finished OCR task, storing non-empty text in the
+    page cache. Pages lost to an error come back with empty text. Pages that
+    plan_ocr had to render below ocr_dpi() are not cached: the key doesn't
+    carry the resolution, and a later request with memory to spare should
+    not be served the degraded text.
+    """
+    try:
+        results = future.result()
+    except BrokenProcessPool as e:
+        # A worker died (e.g. OOM) - drop the pool so the next call rebuilds it
+        print(f"OCR pool broken, restarting: {e}")
+        shutdown_ocr_pool(wait=False)
+        results = []
+    except Exception as e:
+        print(f"Error running OCR on pages {[i + 1 for i in page_range]}: {e}")
+        results = []
+
+    pages = {result["page"] - 1: result for result in results}
+    for result in results:
+        for stage, seconds in result.pop("timings", {}).items():
+            record_stage(stage, seconds)
+    for i in page_range:
+        if i not in pages:
+            pages[i] = {"page": i + 1, "source": SOURCE_OCR, "text": "", "seconds": 0.0}
+        elif page_keys.get(i) and dpi >= ocr_dpi() and pages[i]["text"].strip():
+            page_cache.set(page_keys[i], pages[i]["text"])
+    return [pages[i] for i in page_range]
+
+def _extract_pages(doc, pdf_path, on_page=None):
+    """
+    Run the per-page strategy over an open document.
+    Text layers are read inline; pages that need OCR are looked up in the page
+    cache by content hash, and only the misses are split into ranges and sent
+    to the OCR process pool, where each worker reopens the file.
+    on_page, if given, is called with each page's result as soon as it is done.
+    """
+    pages = [None] * len(doc)
+    ocr_pages = []
+    page_keys = {}
+    page_cache = get_page_cache()
+
+    for i in range(len(doc)):
+        pages[i] = _page_without_ocr(doc, i, page_cache, page_keys)
+        if pages[i] is None:
+            ocr_pages.append(i)
+        elif on_page:
+            on_page(pages[i])
+
+    if ocr_pages:
+        # Sliding window: at most `parallel` ranges are submitted at a time,
+        # each OCR'd one page after another, to stay within the memory budget
+        parallel, dpi = plan_ocr(doc, ocr_pages)
+        pending = deque(_split_ranges(ocr_pages, parallel))
+        futures = {}
+        while pending or futures:
+            while pending and len(futures) < parallel:
+                page_range = pending.popleft()
+                futures[get_ocr_pool().submit(_ocr_page_range, pdf_path, page_range, dpi)] = page_range
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                for page in _ocr_results(future, futures.pop(future), page_keys, page_cache, dpi):
+                    pages[page["page"] - 1] = page
+                    if on_page:
+                        on_page(page)
+
+    return pages
+
+def _print_extraction_report(pdf_path, pages, elapsed):
+    """Print which pages took the text-layer path and which were OCR'd"""
+    text_layer = [p["page"] for p in pages if p["source"] == SOURCE_TEXT_LAYER]
+    ocr = [p["page"] for p in pages if p["source"] == SOURCE_OCR]
+    cached = sum(1 for p in pages if p.get("cached"))
+    print(
+        f"📄 {os.path.basename(pdf_path)}: {len(pages)} pages in {elapsed:.2f}s "
+        f"- text layer: {len(text_layer)} {text_layer}, OCR: {len(ocr)} {ocr} ({cached} from cache)"
+    )
+
+def _page_report(page):
+    """Report entry for one extracted page, without its text"""
+    return {
+        "page": page["page"],
+        "source": page["source"],
+        "chars": len(page["text"]),
+        "seconds": page["seconds"],
+        "cached": page.get("cached", False),
+    }
+
+def extract_pages_report(pdf_path, on_page=None):
+    """
+    Extract the text of each page of a PDF and report how each page was processed
+
+    Args:
+        pdf_path: Path to the PDF file
+        on_page: Optional callback receiving each page's report entry
+            ({"page", "source", "chars", "seconds", "cached"}) as soon as it is done
+
+    Returns:
+        Tuple of (texts, pages): the text of each page, and a list of
+        {"page", "source", "chars", "seconds", "cached"} dicts, both in page order
+    """
+    try:
+        start = time.perf_counter()
+        with span("extraction"):
+            doc = fitz.open(pdf_path)
+            pages = _extract_pages(doc, pdf_path, on_page and (lambda page: on_page(_page_report(page))))
+            doc.close()
+            release_page_memory()
+
+        for page in pages:
+            EXTRACTED_PAGES.inc(source="cache" if page.get("cached") else page["source"])
+        _print_extraction_report(pdf_path, pages, time.perf_counter() - start)
+        return [p["text"] for p in pages], [_page_report(p) for p in pages]
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
-        return ""
+        return [], []
+
+def extract_text_report(pdf_path, on_page=None):
+    """
+    Extract text from PDF and report how each page was processed
+
+    Args:
+        pdf_path: Path to the PDF file
+        on_page: Optional callback receiving each page's report entry as soon as it is done
+
+    Returns:
+        Tuple of (text, pages) where pages is a list of
+        {"page", "source", "chars", "seconds", "cached"} dicts in page order
+    """
+    texts, pages = extract_pages_report(pdf_path, on_page)
+    return "\n".join(texts), pages
+
+def extract_text_fast(pdf_path):
+    """
+    Extract text from PDF while excluding tables and boxed content
+    """
+    text, _ = extract_text_report(pdf_path)
+    return text
 
 def extract_text_with_pages(pdf_path):
     """
@@ -65,22 +752,15 @@ def extract_text_with_pages(pdf_path):
     """
     try:
         doc = fitz.open(pdf_path)
-        page_texts = {}
-        
-        for i in range(len(doc)):
-            page = doc[i]
-            text = process_page(page)
-            page_texts[i + 1] = text  # Page numbers start from 1
-        
+        pages = _extract_pages(doc, pdf_path)
         doc.close()
-        return page_texts
+        return {p["page"]: p["text"] for p in pages}  # Page numbers start from 1
     except Exception as e:
         print(f"Error extracting text with pages from {pdf_path}: {e}")
         return {}
 
 def normalize_text(text):
     """Normalize text for comparison - from original version"""
-    import re
     # Convert to lowercase
     text = text.lower()
     # Replace multiple spaces/newlines/tabs with a single space